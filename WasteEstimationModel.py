@@ -1,130 +1,199 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import matplotlib.pyplot as plt
-import pgeocode
+import importlib
+import time
+import uuid
+from chat_flow import CHAT_SPILL_DIR, ChatHistory, compile_flow
+from downsample import DEFAULT_POINT_BUDGET, downsample_cumulative
+from forecast import FORECAST_MONTHS, MIN_HISTORY_MONTHS, waste_forecast
+from instrumentation import StageTimer
+from distance_cache import DistanceCache
+from geo import load_postal_index
+from ingest import analyze_pipelined
+from pipeline import StagedPipeline
+from rates import DEFAULT_SERVICE, load_rate_store
+from result_store import AppendStore, is_valid_workspace, list_analyses, load_analysis, save_analysis
+from uncertainty import DEFAULT_DRAWS, DEFAULT_LEVEL, waste_intervals
+from waste_engine import CATEGORIES, cube_views, filter_cube, load_memory_report, load_sku_origins
+from warmup import start_warmup
 
 # Configure Streamlit page Title
 st.set_page_config(page_title="Waste Estimation Model", layout="wide")
 st.title("Waste Estimation Model")
 
+
+def plotly_express():
+    # imported on first use: only the open dashboard tab needs it
+    return importlib.import_module("plotly.express")
+
+
+# Once per process: load the postal dataset, rate tables and plotting library in
+# the background while the first page renders, so the first analysis and the
+# first chart don't pay for them.
+@st.cache_resource
+def warm_up():
+    return start_warmup(load_postal_index, load_rate_store, plotly_express)
+
+
+warm_up()
+
 if "analysis_ready" not in st.session_state:
     st.session_state.analysis_ready = False  # did we already run analysis successfully?
 if "df_order" not in st.session_state:
     st.session_state.df_order = None
 if "total_waste" not in st.session_state:
     st.session_state.total_waste = None
+if "aggregates" not in st.session_state:
+    st.session_state.aggregates = None
 
-# Step 1: Create USPS Shipping Rate Table
-rate = {
-    "weight": [
-        0.25, 0.5, 0.75, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17,
-        18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37,
-        38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57,
-        58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 80
-    ],
-    "Zone 1": [5.25, 6.00, 6.75, 8.35, 9.45, 9.85, 10.70, 11.35, 11.80, 12.25, 12.75, 13.20, 13.95, 14.65, 15.25, 15.90, 16.55, 17.20, 17.85, 18.50, 19.10, 19.50, 19.90, 22.95, 25.00, 26.30, 27.30, 28.35, 29.30, 30.30, 31.05, 31.85, 32.60, 33.45, 34.10, 34.85, 35.60, 36.35, 37.00, 37.75, 38.45, 39.15, 39.80, 40.50, 41.20, 41.80, 42.50, 43.10, 43.75, 44.35, 44.95, 45.55, 46.15, 46.75, 47.35, 47.90, 48.45, 48.95, 49.55, 50.05, 50.55, 51.10, 51.55, 52.05, 52.55, 53.05, 53.45, 53.90, 54.35, 54.75, 55.25, 55.60, 56.05, 98.00],
-    "Zone 2": [5.35, 6.10, 6.90, 8.55, 10.05, 10.50, 11.15, 11.85, 12.15, 12.60, 13.00, 13.45, 14.25, 15.10, 15.65, 16.20, 16.65, 17.30, 18.00, 18.70, 19.30, 19.75, 20.05, 24.05, 26.75, 28.35, 29.40, 30.55, 31.70, 32.80, 33.70, 34.55, 35.45, 36.25, 37.10, 37.90, 38.70, 39.50, 40.25, 41.00, 41.75, 42.50, 43.30, 44.00, 44.65, 45.40, 46.10, 46.75, 47.45, 48.15, 48.75, 49.35, 50.00, 50.60, 51.20, 51.75, 52.35, 52.90, 53.45, 54.00, 54.45, 55.05, 55.50, 56.00, 56.45, 56.95, 57.35, 57.85, 58.25, 58.65, 59.05, 59.45, 59.85, 108.75],
-    "Zone 3": [5.40, 6.15, 6.95, 8.65, 10.65, 11.05, 11.95, 12.70, 13.00, 13.45, 13.85, 14.20, 15.05, 15.85, 16.30, 16.75, 17.20, 17.85, 18.55, 19.15, 19.80, 20.65, 21.40, 26.00, 29.45, 31.35, 32.70, 34.00, 35.35, 36.70, 37.75, 38.70, 39.70, 40.65, 41.60, 42.55, 43.45, 44.35, 45.20, 46.10, 46.85, 47.75, 48.55, 49.40, 50.15, 50.95, 51.65, 52.45, 53.15, 53.90, 54.55, 55.30, 55.95, 56.55, 57.20, 57.75, 58.40, 59.00, 59.55, 60.10, 60.60, 61.20, 61.65, 62.15, 62.60, 63.05, 63.45, 63.95, 64.30, 64.70, 65.05, 65.45, 65.75, 124.85],
-    "Zone 4": [5.50, 6.20, 7.00, 8.85, 11.40, 12.00, 13.00, 13.85, 14.30, 14.95, 15.45, 16.00, 16.95, 17.85, 18.60, 19.05, 19.75, 20.30, 21.25, 22.20, 22.70, 23.10, 23.90, 30.65, 35.55, 38.20, 39.95, 41.80, 43.60, 45.50, 46.80, 48.20, 49.45, 50.70, 52.00, 53.25, 54.40, 55.65, 56.75, 58.00, 59.10, 60.25, 61.40, 62.50, 63.55, 64.60, 65.65, 66.70, 67.70, 68.70, 69.65, 70.60, 71.55, 72.45, 73.35, 74.25, 75.05, 75.95, 76.80, 77.50, 78.35, 79.05, 79.85, 80.55, 81.25, 82.00, 82.60, 83.25, 83.90, 84.45, 85.10, 85.60, 86.20, 151.65],
-    "Zone 5": [5.65, 6.30, 7.10, 9.00, 12.30, 13.10, 14.35, 15.25, 16.10, 17.00, 17.85, 18.70, 19.95, 21.15, 22.20, 23.10, 24.30, 25.30, 26.40, 27.50, 28.65, 29.55, 30.75, 37.90, 43.10, 46.20, 48.45, 50.60, 52.75, 55.00, 56.75, 58.50, 60.15, 61.80, 63.45, 65.10, 66.60, 68.25, 69.75, 71.30, 72.80, 74.35, 75.80, 77.35, 78.75, 80.20, 81.60, 83.00, 84.35, 85.70, 87.05, 88.40, 89.65, 90.95, 92.20, 93.40, 94.60, 95.80, 97.00, 98.15, 99.30, 100.40, 101.45, 102.55, 103.60, 104.55, 105.60, 106.60, 107.55, 108.50, 109.45, 110.35, 111.25, 178.20],
-    "Zone 6": [5.70, 6.35, 7.15, 9.10, 13.20, 14.40, 16.00, 17.15, 18.40, 19.75, 21.05, 22.35, 24.05, 25.75, 27.35, 28.95, 30.85, 32.15, 33.45, 34.95, 36.50, 37.45, 38.65, 46.80, 52.55, 56.05, 58.75, 61.30, 63.90, 66.55, 68.65, 70.65, 72.70, 74.70, 76.70, 78.60, 80.50, 82.45, 84.25, 86.05, 87.90, 89.70, 91.50, 93.30, 94.95, 96.65, 98.40, 99.95, 101.65, 103.15, 104.80, 106.30, 107.85, 109.40, 110.80, 112.25, 113.65, 115.00, 116.40, 117.75, 119.05, 120.35, 121.60, 122.85, 124.05, 125.20, 126.35, 127.50, 128.65, 129.70, 130.75, 131.75, 132.75, 204.90],
-    "Zone 7": [5.75, 6.40, 7.25, 9.25, 14.40, 16.55, 18.25, 19.60, 21.30, 22.95, 24.90, 26.85, 29.15, 31.45, 33.80, 36.45, 39.20, 40.80, 42.40, 44.45, 46.45, 47.30, 48.55, 56.80, 62.55, 66.35, 69.30, 72.20, 75.10, 77.95, 80.35, 82.70, 85.10, 87.30, 89.60, 91.75, 93.95, 96.20, 98.25, 100.35, 102.45, 104.50, 106.50, 108.50, 110.40, 112.35, 114.25, 116.15, 117.90, 119.75, 121.55, 123.25, 124.95, 126.65, 128.25, 129.85, 131.50, 132.95, 134.55, 135.95, 137.45, 138.85, 140.30, 141.60, 142.90, 144.20, 145.45, 146.65, 147.85, 149.00, 150.15, 151.20, 152.25, 230.55],
-    "Zone 8": [5.85, 6.55, 7.35, 9.45, 16.65, 19.60, 21.20, 22.75, 24.80, 26.75, 29.00, 31.20, 34.50, 37.85, 40.65, 44.55, 48.00, 50.15, 52.35, 54.95, 57.55, 59.45, 60.65, 68.65, 73.95, 77.85, 81.10, 84.25, 87.45, 90.60, 93.40, 96.05, 98.65, 101.25, 103.80, 106.30, 108.70, 111.20, 113.50, 115.95, 118.25, 120.50, 122.75, 125.00, 127.15, 129.30, 131.35, 133.45, 135.45, 137.45, 139.35, 141.30, 143.15, 144.90, 146.70, 148.45, 150.20, 151.85, 153.45, 155.05, 156.60, 158.05, 159.60, 160.95, 162.40, 163.70, 165.05, 166.30, 167.60, 168.75, 169.85, 170.95, 172.05, 257.25]
-   
-}
+# Step 1: USPS Shipping Rate Tables (rate_tables/, compiled and loaded once per
+# process by rates.py) and packaging fractions (waste_engine.py)
+
+# Distance cache is shared by every session of this process
+@st.cache_resource
+def get_distance_cache():
+    return DistanceCache()
 
-# Create the Data Frame
-df_rate = pd.DataFrame(rate)
 
+# Per-session memo of pipeline stages: re-running with only a new category or
+# origin reuses the parsed CSV / distances instead of starting over.
+# Only the columns the model needs are loaded, with compact dtypes.
+if "pipeline" not in st.session_state:
+    st.session_state.pipeline = StagedPipeline(get_distance_cache(), compact=True)
+
+
+# Every finished analysis is saved (result_store.py) in a workspace named by the
+# random ?workspace= token in the page URL, so it can be reopened without
+# uploading the CSV or re-running anything, also in a later session from a
+# bookmark, while visitors without the token never see it.
+if "workspace" not in st.session_state:
+    workspace = st.query_params.get("workspace")
+    st.session_state.workspace = workspace if is_valid_workspace(workspace) else uuid.uuid4().hex
+st.query_params["workspace"] = st.session_state.workspace
+saved_analyses = list_analyses(st.session_state.workspace)
+if saved_analyses:
+    with st.expander("Past analyses"):
+        st.caption("Bookmark this page to come back to these analyses: its address holds your workspace token.")
+        labels = {
+            meta["id"]: f"{meta['saved_at'].replace('T', ' ')} · {meta['file']} · "
+                        f"{meta['origin']} · {meta['category']} · {round(meta['total_waste'], 2)} lbs"
+            for meta in saved_analyses
+        }
+        chosen = st.selectbox("Saved analysis", list(labels), format_func=labels.get)
+        if st.button("Open saved analysis"):
+            _, aggregates, meta = load_analysis(chosen, st.session_state.workspace)
+            st.session_state.df_order = None
+            st.session_state.aggregates = aggregates
+            st.session_state.total_waste = aggregates['total_waste']
+            st.session_state.cache_stats = None
+            st.session_state.reused_stages = []
+            st.session_state.appended = None
+            st.session_state.opened_analysis = labels[chosen]
+            st.session_state.perf_timer = None
+            st.session_state.views = {}
+            st.session_state.analysis_ready = True
 
 # Step 2: Get CSV and ZIP input from user
 uploaded_file = st.file_uploader("Upload your Sold Orders CSV file", type="csv")
-zipcode_from = st.text_input("Enter your origin ZIP code").strip()
-CATEGORIES = [
-    "— Select —",
-    "Jewelry & Accessories",
-    "Clothing",
-    "Home & Living",
-    "Art & Prints",
-    "Bags & Purses",
-    "Bath, Beauty, & Health",
-    "Toys, Games, & Kids",
-    "Books, Music, & Media",
-    "Food & Beverages",
-    "Stationery & Small Gifts",
-]
-category = st.selectbox("Select your business category", CATEGORIES, index=0)
-
-# Packaging weight fraction defaults by category (fraction of shipped weight)
-CATEGORY_PACKAGING_FRACTION = {
-    "Jewelry & Accessories": 0.20,     # small item + protective mailer/paper
-    "Clothing": 0.08,                  # poly/paper mailer + minimal inner wrap
-    "Home & Living": 0.05,             # larger/heavier items; packaging is a smaller share
-    "Art & Prints": 0.15,              # rigid mailers/tubes + flat protection
-    "Bags & Purses": 0.10,
-    "Bath, Beauty, & Health": 0.12,    # jars/tins/inner wraps can add weight
-    "Toys, Games, & Kids": 0.09,
-    "Books, Music, & Media": 0.07,     # rigid mailer/box, modest padding
-    "Food & Beverages": 0.12,          # food-safe inner + cushioning
-    "Stationery & Small Gifts": 0.19,
-}
+zipcode_from = st.text_input(
+    "Enter your origin ZIP code",
+    help="Orders with their own 'Origin Zipcode' column value, or a SKU in the warehouse "
+         "mapping below, ship from there instead.",
+).strip()
+sku_file = st.file_uploader("Optional: SKU to warehouse ZIP mapping (CSV with SKU, origin_zip columns)", type="csv")
+category = st.selectbox("Select your business category", ["— Select —", *CATEGORIES], index=0)
+rate_services = load_rate_store().services
+service = DEFAULT_SERVICE
+if len(rate_services) > 1:
+    service = st.selectbox("USPS service", rate_services, index=rate_services.index(DEFAULT_SERVICE),
+                           help="Each order is priced with this service's rates in effect on its Sale Date.")
+MODE_STANDARD = "Standard"
+MODE_STREAM = "Large file: process in chunks"
+MODE_APPEND = "Append: only process orders not seen before"
+run_mode = st.radio(
+    "Processing mode",
+    [MODE_STANDARD, MODE_STREAM, MODE_APPEND],
+    horizontal=True,
+    help="Chunked mode keeps only running totals, so memory stays flat, and parses, geocodes and "
+         "prices consecutive chunks at the same time. Append mode keeps a "
+         "local history per history name, origin ZIP, category and USPS service and only processes "
+         "new Order IDs (or new rows, without them). Both plot one cumulative point per day.",
+)
+history_name = ""
+if run_mode == MODE_APPEND:
+    history_name = st.text_input("History name", help="Your shop or seller name: each name keeps its own "
+                                                      "history, so sellers sharing a ZIP and category don't mix.").strip()
 
 # Step 3: Data Processing if Input is Valid
 is_valid_csv = (uploaded_file is not None) and (uploaded_file.type == "text/csv")
 is_valid_zip = (zipcode_from != "") and zipcode_from.isdigit() and (len(zipcode_from) == 5)
 is_valid_cat = (category != "— Select —")
-all_valid = is_valid_csv and is_valid_zip and is_valid_cat
+all_valid = is_valid_csv and is_valid_zip and is_valid_cat and (run_mode != MODE_APPEND or history_name != "")
+
+trace_memory = st.checkbox("Measure peak memory per stage (slower)", value=False)
 
 run_clicked = st.button("►   Run analysis", type="primary", disabled=not all_valid)
+run_done = False
 
 if run_clicked:
     # Step 4: Read in sold order data
-    df_order = pd.read_csv(uploaded_file)
-    df_order['zipcode_to'] = df_order['Ship Zipcode'].astype(str).str[:5]
-    
-    # Step 5: Calculate distance bewtween origin zip code and destination
-    dist = pgeocode.GeoDistance('us')
-    df_order['distance_miles'] = df_order['zipcode_to'].apply(
-        lambda dest: dist.query_postal_code(zipcode_from, dest) * 0.621371
-    )
-    
-    # Assign distance categories
-    conditions = [
-        df_order['distance_miles'] <= 50,
-        (df_order['distance_miles'] > 50) & (df_order['distance_miles'] <= 150),
-        (df_order['distance_miles'] > 150) & (df_order['distance_miles'] <= 300),
-        (df_order['distance_miles'] > 300) & (df_order['distance_miles'] <= 600),
-        (df_order['distance_miles'] > 600) & (df_order['distance_miles'] <= 1000),
-        (df_order['distance_miles'] > 1000) & (df_order['distance_miles'] <= 1400),
-        (df_order['distance_miles'] > 1400) & (df_order['distance_miles'] <= 1800),
-        df_order['distance_miles'] > 1800
-    ]
-    choices = list(range(1, 9))
-    df_order['distance_cat'] = np.select(conditions, choices, default=np.nan).astype(int)
-    # if foreign country, set it as 8
-    df_order.loc[df_order['distance_miles'].isna(), 'distance_cat'] = 8
-    #df_order_new = df_order[(df_order["distance_cat"] >=1) & (df_order["distance_cat"] <=8) ]
-        
-    # Function to match USPS rate table
-    def match_weight(distance_cat, shipping_cost):
-        zone_col = f"Zone {distance_cat}"
-        diffs = (df_rate[zone_col] - shipping_cost).abs()
-        best_idx = diffs.idxmin()
-        return df_rate.loc[best_idx, 'weight']
-    
-    df_order['shipping_cost'] = df_order['Order Shipping'] / 0.78
-    df_order['matched_weight'] = df_order.apply(lambda r: match_weight(r['distance_cat'], r['shipping_cost']), axis=1)
-    # 20% of weight is package weight
-    frac = CATEGORY_PACKAGING_FRACTION.get(category)
-    df_order['package_weight'] = df_order['matched_weight'] * frac
-    df_order['Sale Date'] = pd.to_datetime(df_order['Sale Date'])
-    df_order = df_order.sort_values('Sale Date')
-    # store results so we don't lose them on rerun
-    st.session_state.df_order = df_order
-    st.session_state.total_waste = df_order['package_weight'].sum()
-    st.session_state.analysis_ready = True
+    # Step 5: Distance/zone per order (cached per ZIP pair), matched USPS weight
+    # and the category's packaging share of it -- see waste_engine.py
+    distance_cache = get_distance_cache()
+    cache_before = distance_cache.stats()  # the cache is shared, so its counters are process-wide
+    reused_stages = []
+    st.session_state.appended = None
+    timer = StageTimer(trace_memory=trace_memory)
+    try:
+        sku_origins = load_sku_origins(sku_file) if sku_file is not None else None
+        if run_mode == MODE_STREAM:
+            df_order = None
+            progress = st.progress(0.0, text="Processing orders…")
+
+            def show_progress(rows, fraction):
+                progress.progress(fraction or 0.0, text=f"Processed {rows:,} orders…")
+
+            with timer.stage("stream (all stages, pipelined)") as record:
+                aggregates = analyze_pipelined(uploaded_file, zipcode_from, category,
+                                               distance_cache=distance_cache, compact=True, sku_origins=sku_origins,
+                                               service=service, on_progress=show_progress)
+                record["rows"] = aggregates['order_count']
+            progress.empty()
+        elif run_mode == MODE_APPEND:
+            df_order = None
+            store = AppendStore(zipcode_from, category, service, name=history_name)
+            with timer.stage("append (new orders)") as record:
+                st.session_state.appended, aggregates = store.append(uploaded_file, distance_cache,
+                                                                     sku_origins=sku_origins)
+                record["rows"] = st.session_state.appended
+        else:
+            df_order, aggregates = st.session_state.pipeline.run(uploaded_file, zipcode_from, category, timer,
+                                                                 sku_origins, service)
+            reused_stages = [stage for stage, how in st.session_state.pipeline.last_run.items() if how == "cached"]
+    except (FileNotFoundError, ValueError) as exc:  # no centroid store yet, bad CSV or SKU mapping
+        st.error(str(exc))
+    else:
+        save_analysis(df_order, aggregates, {"file": uploaded_file.name, "origin": zipcode_from,
+                                             "category": category, "mode": run_mode}, st.session_state.workspace)
+        st.session_state.opened_analysis = None
+        st.session_state.run_settings = {"category": category, "service": service}
+        st.session_state.intervals = None
+        st.session_state.perf_meta = {"file": uploaded_file.name, "origin": zipcode_from,
+                                      "category": category, "mode": run_mode}
+        timer.log(**st.session_state.perf_meta)
+        st.session_state.perf_timer = timer
+        st.session_state.reused_stages = reused_stages
+        cache_after = distance_cache.stats()
+        st.session_state.cache_stats = {"hits": cache_after["hits"] - cache_before["hits"],
+                                        "misses": cache_after["misses"] - cache_before["misses"],
+                                        "entries": cache_after["entries"]}
+        # store results so we don't lose them on rerun
+        st.session_state.df_order = df_order
+        st.session_state.aggregates = aggregates
+        st.session_state.views = {}
+        st.session_state.total_waste = aggregates['total_waste']
+        st.session_state.analysis_ready = True
+        run_done = True
     
 if not st.session_state.analysis_ready:        
     if uploaded_file is None:
@@ -134,117 +203,285 @@ if not st.session_state.analysis_ready:
     elif category == "— Select —":
         st.warning("Action 3: Please select your business category.")
 
-if st.session_state.analysis_ready and st.session_state.df_order is not None:
-    df_order = st.session_state.df_order.copy()
+# Figures and derived tables are built once per analysis result and kept in
+# session state, so reruns (e.g. chat clicks) don't rebuild them.
+def cached_view(name, build):
+    views = st.session_state.setdefault("views", {})
+    if name not in views:
+        views[name] = build()
+    return views[name]
+
+
+def build_monthly_figures(aggregates):
+    px = plotly_express()
+    monthly = aggregates['monthly'].copy()
+    monthly['Month'] = monthly['Sale Date'].dt.strftime('%b')  # Format like "Jan"
+
+    fig1 = px.bar(
+        monthly,
+        x='Month',                        
+        y='package_weight',
+        title='Monthly Waste: Bar Chart',
+        color_discrete_sequence=['green']
+    )
+    fig1.update_layout(
+        xaxis_title='Month',
+        yaxis_title='Waste Weight (lb)'
+    )                
+
+    fig2 = px.line(
+        monthly,
+        x='Month',
+        y='package_weight',
+        title='Monthly Waste: Line Graph',
+        line_shape='linear'
+    )
+    fig2.update_traces(line_color='green')
+    fig2.update_layout(
+        xaxis_title='Month', 
+        yaxis_title='Waste Weight (lb)'
+    )
+    return fig1, fig2
+
+
+# Max points of the cumulative line sent to the browser (one per day, LTTB-decimated past this)
+CUMULATIVE_POINT_BUDGET = DEFAULT_POINT_BUDGET
+
+
+def build_cumulative_figure(aggregates):
+    px = plotly_express()
+    fig3 = px.line(
+        downsample_cumulative(aggregates['cumulative'], CUMULATIVE_POINT_BUDGET),
+        x='Sale Date',
+        y='Cumulative Waste', 
+        title='Cumulative Waste Over Time'
+    )
+    fig3.update_traces(line_color='green')
+    fig3.update_layout(
+        xaxis_title='Date', 
+        yaxis_title='Waste Weight (lb)'
+    )
+    return fig3
+
+
+def build_state_figure(aggregates):
+    px = plotly_express()
+    # U.S. State Choropleth Map            
+    fig4 = px.choropleth(
+        aggregates['state_sales'],            
+        locations='Ship State',
+        locationmode='USA-states',
+        color='package_weight',
+        scope='usa',
+        color_continuous_scale='Greens',
+        labels={'package_weight': 'Waste Weight (lb)'},
+        title='Waste by U.S. State'
+    )
+    fig4.update_layout(
+        coloraxis_colorbar_title="Waste (lb)",
+        width=1200,
+        height=700
+    )
+    return fig4
+
+
+def build_forecast_figure(aggregates, projection):
+    px = plotly_express()
+    actual = aggregates['monthly'].assign(Series='Actual')
+    projected = projection['monthly'].assign(Series='Forecast')
+    # start the forecast line at the last complete month so the two lines join
+    anchor = actual[actual['Sale Date'] < projected['Sale Date'].min()].tail(1)
+    projected = pd.concat([anchor.assign(Series='Forecast'), projected])
+    fig5 = px.line(
+        pd.concat([actual, projected]),
+        x='Sale Date',
+        y='package_weight',
+        color='Series',
+        line_dash='Series',
+        title=f'Monthly Waste: {len(projection["monthly"])}-Month Forecast',
+        color_discrete_map={'Actual': 'green', 'Forecast': 'gray'}
+    )
+    fig5.update_layout(
+        xaxis_title='Month',
+        yaxis_title='Waste Weight (lb)'
+    )
+    return fig5
+
+
+def build_top_states(aggregates):
+    top_states = aggregates['state_sales'].sort_values(by='package_weight', ascending=False).head(5)
+    top_states = top_states.rename(columns={
+        'Ship State': 'State',
+        'package_weight': 'Total Waste Weight (lb)'
+    })
+    top_states.insert(0, 'Rank', range(1, len(top_states) + 1))
+    return top_states.reset_index(drop=True)
+
+
+if st.session_state.analysis_ready and st.session_state.aggregates is not None:
+    aggregates = st.session_state.aggregates
+    charts_started = time.perf_counter()
         
     st.divider()
+
+    # Date range and zone filters are answered from the waste cube (sums per day,
+    # state, country and zone), never from the per-order rows
+    cube = aggregates.get('cube')
+    filtered = False
+    if cube is not None and cube['Sale Date'].notna().any():
+        first_day, last_day = cube['Sale Date'].min().date(), cube['Sale Date'].max().date()
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            date_range = st.date_input("Sale dates", (first_day, last_day), min_value=first_day, max_value=last_day)
+        with filter_col2:
+            zones = st.multiselect("USPS zones", list(range(1, 9)), default=list(range(1, 9)))
+        if not date_range:  # the widget was cleared: show every date
+            date_range = (first_day, last_day)
+        start, end = date_range[0], date_range[-1]  # a single date while the range is being picked
+        view_filters = (start, end, tuple(zones))
+        if st.session_state.get("view_filters") != view_filters:
+            st.session_state.view_filters = view_filters
+            st.session_state.views = {}
+        aggregates = cached_view("aggregates", lambda: cube_views(cube, start, end, zones))
+        cube = cached_view("cube", lambda: filter_cube(cube, start, end, zones))
+        filtered = view_filters != (first_day, last_day, tuple(range(1, 9)))
     
     # Step 6: ================== VISUALIZATION TABS ==================
+    # Only the open tab is rendered; switching tabs reruns the script
     tab_summary, tab_trends, tab_states = st.tabs([
         "Summary",
         "Packaging Waste Trends",
         "Packaging Waste by State",
-    ])
+    ], key="dashboard_tab", on_change="rerun")
     # ---------- SUMMARY TAB ----------
     # Total estimated waste
     with tab_summary:
-        total_waste = df_order['package_weight'].sum()
-        year = df_order['Sale Date'].dt.year.mode()[0]
-        st.subheader("Total Estimated Packaging Waste (lbs)")
-        st.markdown(f"<h2 style='color:green;'>{round(total_waste, 2)} lbs</h2>", unsafe_allow_html=True)
+        if tab_summary.open:
+            total_waste = aggregates['total_waste']
+            st.subheader("Total Estimated Packaging Waste (lbs)")
+            st.markdown(f"<h2 style='color:green;'>{round(total_waste, 2)} lbs</h2>", unsafe_allow_html=True)
+            if filtered:
+                st.caption(f"Filtered view: {aggregates['order_count']} of "
+                           f"{st.session_state.aggregates['order_count']} orders")
+            if st.session_state.get("opened_analysis"):
+                st.caption(f"Saved analysis: {st.session_state.opened_analysis}")
+            cache_stats = st.session_state.get("cache_stats")
+            if cache_stats:
+                st.caption(
+                    f"Distance cache, this run: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['entries']} ZIP pairs stored for all sessions)"
+                )
+            if st.session_state.get("appended") is not None:
+                st.caption(f"Append mode: {st.session_state.appended} new orders added to the saved history "
+                           f"({st.session_state.aggregates['order_count']} orders in total)")
+            if st.session_state.get("reused_stages"):
+                st.caption("Reused from the previous run: " + ", ".join(st.session_state.reused_stages))
+            origin_sales = aggregates.get('origin_sales')
+            if origin_sales is not None and len(origin_sales) > 1:
+                st.markdown("**Waste by origin ZIP**")
+                st.table(origin_sales.rename(columns={
+                    'zipcode_from': 'Origin ZIP',
+                    'package_weight': 'Total Waste Weight (lb)',
+                    'orders': 'Orders'
+                }))
+            if st.session_state.df_order is not None:
+                with st.expander("Uncertainty"):
+                    st.caption(f"{DEFAULT_DRAWS} Monte Carlo draws over the shipping discount, the weight "
+                               "match and the packaging share; all orders, ignoring the filters above.")
+                    if st.button(f"Estimate {DEFAULT_LEVEL:.0%} intervals"):
+                        progress = st.progress(0.0, text="Simulating…")
+
+                        def show_draws(done, fraction):
+                            progress.progress(fraction, text=f"Simulated {done:,} of {DEFAULT_DRAWS:,} draws…")
+
+                        st.session_state.intervals = waste_intervals(st.session_state.df_order,
+                                                                     on_progress=show_draws,
+                                                                     **st.session_state.run_settings)
+                        progress.empty()
+                    intervals = st.session_state.get("intervals")
+                    if intervals is not None:
+                        total = intervals['total']
+                        st.markdown(f"**{total['low']:.2f} – {total['high']:.2f} lbs** "
+                                    f"(median {total['median']:.2f} lbs)")
+                        band_columns = {'low': 'Low (lb)', 'median': 'Median (lb)', 'high': 'High (lb)'}
+                        monthly_bands = intervals['monthly'].rename(columns=band_columns)
+                        monthly_bands['Sale Date'] = monthly_bands['Sale Date'].dt.strftime('%b %Y')
+                        st.dataframe(monthly_bands.rename(columns={'Sale Date': 'Month'}).round(2), hide_index=True)
+                        st.dataframe(intervals['state_sales'].rename(columns={'Ship State': 'State', **band_columns})
+                                     .round(2), hide_index=True)
+            if uploaded_file is not None and st.session_state.df_order is not None:
+                with st.expander("Memory use by column"):
+                    st.caption("The uploaded CSV loaded with every column at default dtypes, against the "
+                               "column-pruned compact load the model uses. Measuring reads the file twice.")
+                    if st.button("Measure memory use"):
+                        st.session_state.views["memory_report"] = load_memory_report(uploaded_file)
+                    mem_report = st.session_state.views.get("memory_report")
+                    if mem_report is not None:
+                        st.dataframe((mem_report / 1e6).round(2).rename(columns={
+                            'before_bytes': 'Full load (MB)', 'after_bytes': 'Compact load (MB)'}))
         
     # ---------- TRENDS TAB ----------
     # Packaging Waste Trends
     with tab_trends:
-        st.subheader("Packaging Waste Trends")
-        col1, spacer, col2 = st.columns([1, 0.2, 1])
-    
-        with col1: # monthly waste
-            monthly = df_order.resample('M', on='Sale Date')['package_weight'].sum().reset_index()
-            monthly['Month'] = monthly['Sale Date'].dt.strftime('%b')  # Format like "Jan"
-    
-            tab1, tab2 = st.tabs(["📊 Bar Chart", "📈 Line Graph"])
+        if tab_trends.open:
+            st.subheader("Packaging Waste Trends")
+            col1, spacer, col2 = st.columns([1, 0.2, 1])
         
-            with tab1: # bar chart
-                fig1 = px.bar(
-                    monthly,
-                    x='Month',                        
-                    y='package_weight',
-                    title='Monthly Waste: Bar Chart',
-                    color_discrete_sequence=['green']
-                )
-                fig1.update_layout(
-                    xaxis_title='Month',
-                    yaxis_title='Waste Weight (lb)'
-                )                
-                st.plotly_chart(fig1)
-        
-            with tab2: # line graph
-                fig2 = px.line(
-                    monthly,
-                    x='Month',
-                    y='package_weight',
-                    title='Monthly Waste: Line Graph',
-                    line_shape='linear'
-                )
-                fig2.update_traces(line_color='green')
-                fig2.update_layout(
-                    xaxis_title='Month', 
-                    yaxis_title='Waste Weight (lb)'
-                )
-                st.plotly_chart(fig2)
-            
-        with col2: # cumulative line graph
-            df_order['Cumulative Waste'] = df_order['package_weight'].cumsum()
-            fig3 = px.line(
-                df_order, 
-                x='Sale Date',
-                y='Cumulative Waste', 
-                title='Cumulative Waste Over Time'
-            )
-            fig3.update_traces(line_color='green')
-            fig3.update_layout(
-                xaxis_title='Date', 
-                yaxis_title='Waste Weight (lb)'
-            )
-            st.plotly_chart(fig3)
+            with col1: # monthly waste
+                fig1, fig2 = cached_view("monthly", lambda: build_monthly_figures(aggregates))
+                tab1, tab2 = st.tabs(["📊 Bar Chart", "📈 Line Graph"])
+                with tab1: # bar chart
+                    st.plotly_chart(fig1)
+                with tab2: # line graph
+                    st.plotly_chart(fig2)
+                
+            with col2: # cumulative line graph
+                st.plotly_chart(cached_view("cumulative", lambda: build_cumulative_figure(aggregates)))
+
+            # Forecast of the coming months, fitted on the complete months shown above
+            if cube is not None:
+                forecast_months = st.slider("Forecast months", 1, 24, FORECAST_MONTHS, key="forecast_months")
+                projection = cached_view(f"forecast_{forecast_months}",
+                                         lambda: waste_forecast(cube, forecast_months))
+                if projection is None:
+                    st.info(f"Not enough history to forecast: it needs at least {MIN_HISTORY_MONTHS} complete months.")
+                else:
+                    st.plotly_chart(cached_view(f"forecast_figure_{forecast_months}",
+                                                lambda: build_forecast_figure(aggregates, projection)))
                 
         
     # ---------- GEOGRAPHIC TAB ----------
     # State-level analysis
     with tab_states:
-        st.subheader("Packaging Waste by State")
-        us_sales = df_order[df_order['Ship Country'] == 'United States']
-        state_sales = us_sales.groupby('Ship State')['package_weight'].sum().reset_index()
-        # U.S. State Choropleth Map            
-        fig4 = px.choropleth(
-            state_sales,            
-            locations='Ship State',
-            locationmode='USA-states',
-            color='package_weight',
-            scope='usa',
-            color_continuous_scale='Greens',
-            labels={'package_weight': 'Waste Weight (lb)'},
-            title='Waste by U.S. State'
-        )
-        fig4.update_layout(
-            coloraxis_colorbar_title="Waste (lb)",
-            width=1200,
-            height=700
-        )
-        st.plotly_chart(fig4, use_container_width=True)
-        
-        # Top 5 States Tables
-        top_states = state_sales.sort_values(by='package_weight', ascending=False).head(5)
-        top_states = top_states.rename(columns={
-            'Ship State': 'State',
-            'package_weight': 'Total Waste Weight (lb)'
-        })
-        top_states.insert(0, 'Rank', range(1, 6))
-        
-        st.table(top_states.reset_index(drop=True))
-        
-        st.divider()
+        if tab_states.open:
+            st.subheader("Packaging Waste by State")
+            fig4 = cached_view("states", lambda: build_state_figure(aggregates))
+            st.plotly_chart(fig4, use_container_width=True)
+            
+            # Top 5 States Tables
+            st.table(cached_view("top_states", lambda: build_top_states(aggregates)))
+
+            if cube is not None:
+                forecast_months = st.session_state.get("forecast_months", FORECAST_MONTHS)
+                projection = cached_view(f"forecast_{forecast_months}",
+                                         lambda: waste_forecast(cube, forecast_months))
+                if projection is not None:
+                    st.markdown(f"**Projected waste, next {forecast_months} months**")
+                    st.table(cached_view(f"top_states_forecast_{forecast_months}",
+                                         lambda: build_top_states(projection)))
+            
+            st.divider()
+
+    # ---------- PERFORMANCE ----------
+    # Stage timings of the last run; chart building is timed on the rerun that ran it
+    timer = st.session_state.get("perf_timer")
+    if timer is not None:
+        if run_done:
+            timer.add("charts", time.perf_counter() - charts_started, len(aggregates['cumulative']))
+        with st.expander("Performance"):
+            st.dataframe(timer.to_frame().round(4), hide_index=True)
+            st.download_button("Download timings (JSON)", timer.to_json(**st.session_state.perf_meta),
+                               file_name="performance.json", mime="application/json")
 
 
 # ================== CHATBOT ==================
@@ -411,10 +648,17 @@ def build_recommendation_text():
     rec_list = "\n".join([f"{item}" for item in recs])
     return "Based on your business category and statistical results, here is my recommendations personalized for you!" + "\n\n" + rec_list
 
-    
+
+# Checked and compiled once per process; a broken FLOW fails here, not on a click.
+@st.cache_resource
+def chat_flow():
+    return compile_flow(FLOW)
+
+
 # ---------- Session state ----------
+# Bounded history: older messages go to a spill file so the transcript stays complete
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = ChatHistory(spill_dir=CHAT_SPILL_DIR)
 if "current_node" not in st.session_state:
     st.session_state.current_node = "start"
 if "form_data" not in st.session_state:
@@ -428,12 +672,12 @@ if "bootstrapped" not in st.session_state:
 
 def go(node_id: str):
     st.session_state.current_node = node_id
-    node = FLOW[node_id]
+    node = chat_flow()[node_id]
 
     # Personalized Recommendation node
     if node_id == "recommendation":
         dynamic_msg = build_recommendation_text()
-        st.session_state.history.append({"role": "assistant", "content": dynamic_msg})
+        st.session_state.history.append("assistant", dynamic_msg)
         return
         
     # Only add the Start greeting the first time ever
@@ -442,10 +686,10 @@ def go(node_id: str):
             return  # we've already shown the greeting once
         st.session_state.start_message_shown = True
 
-    st.session_state.history.append({"role": "assistant", "content": node["text"]})
+    st.session_state.history.append("assistant", node.text)
 
 def reset_chat():
-    st.session_state.history = []
+    st.session_state.history.clear()
     st.session_state.current_node = "start"
     st.session_state.form_data = {}
     st.session_state.start_message_shown = False
@@ -459,7 +703,7 @@ if not st.session_state.bootstrapped:
 
 def _handle_option_click(label: str, next_node: str):
     # Called by option buttons; no rerun needed
-    st.session_state.history.append({"role": "user", "content": label})
+    st.session_state.history.append("user", label)
     go(next_node)
             
 # ---------- Chat UI renderer (used inside the floating widget) ----------
@@ -469,7 +713,7 @@ def render_chat_ui():
     c1.button("⟳ Restart", use_container_width=True, on_click=reset_chat)
     c2.download_button(
         "↓ Export transcript",
-        data="\n".join([f'{m["role"]}: {m["content"]}' for m in st.session_state.history]),
+        data=st.session_state.history.transcript,  # built only when downloaded
         file_name="chat_transcript.txt",
         use_container_width=True
     )
@@ -477,26 +721,26 @@ def render_chat_ui():
     st.divider()
 
     # History
-    for m in st.session_state.history[-12:]:
+    for m in st.session_state.history.recent(12):
         with st.chat_message(m["role"]):
             st.markdown(m["content"])
 
     node_id = st.session_state.current_node
-    node = FLOW[node_id]
+    node = chat_flow()[node_id]
 
     # Options as buttons (use on_click to avoid double-click feel)
-    if "options" in node and node["options"]:
+    if node.options:
         with st.chat_message("assistant"):
             st.caption("Choose an option:")
-            cols = st.columns(min(3, len(node["options"])))
-            for i, opt in enumerate(node["options"]):
+            cols = st.columns(min(3, len(node.options)))
+            for i, opt in enumerate(node.options):
                 col = cols[i % len(cols)]
                 col.button(
-                    opt["label"],
+                    opt.label,
                     key=f"opt_{node_id}_{i}",  # stable, unique
                     use_container_width=True,
                     on_click=_handle_option_click,
-                    args=(opt["label"], opt["next"])
+                    args=(opt.label, opt.next)
                 )
     else:
         with st.chat_message("assistant"):
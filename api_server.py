@@ -0,0 +1,279 @@
+"""Local HTTP API around the waste estimation pipeline.
+
+    python api_server.py --port 8765 --workers 4 --queue 16
+
+    curl -s --data-binary @orders.csv -H "Content-Type: text/csv" \\
+        "http://127.0.0.1:8765/analyze?origin=10001&category=Clothing"
+    curl -s http://127.0.0.1:8765/metrics
+    curl -s http://127.0.0.1:8765/health
+
+``POST /analyze`` takes a Sold Orders CSV as the request body and ``origin``,
+``category`` and optionally ``service`` and ``chunksize`` (stream the CSV in chunks)
+as query parameters; it answers with the totals, the monthly series, the
+state table and the waste per origin as JSON.
+
+Analyses run on a pool of ``--workers`` threads with at most ``--queue`` more
+waiting; anything beyond that is turned away at once with ``503`` and a
+``Retry-After`` header, before its body is read, so a burst can't pile up
+unbounded work or buffered uploads. The postal
+data and rate tables are loaded once at startup and shared, as is the distance
+cache. The server only binds to loopback addresses.
+"""
+import argparse
+import io
+import ipaddress
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from distance_cache import DistanceCache
+from geo import load_postal_index
+from rates import DEFAULT_SERVICE, load_rate_store
+from waste_engine import analyze, analyze_streaming
+from warmup import start_warmup
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE = 16
+MAX_BODY_BYTES = 512 * 1024 * 1024
+REQUEST_TIMEOUT = 600  # seconds a request may wait for its analysis
+LATENCY_WINDOW = 1000  # requests kept for the latency percentiles
+
+logger = logging.getLogger("waste.api")
+
+
+def result_payload(aggregates):
+    """The aggregates of an analysis as JSON-ready values."""
+    monthly = aggregates['monthly']
+    return {
+        'total_waste': round(aggregates['total_waste'], 4),
+        'order_count': int(aggregates['order_count']),
+        'monthly': [{'month': day.strftime('%Y-%m'), 'package_weight': round(float(weight), 4)}
+                    for day, weight in zip(monthly['Sale Date'], monthly['package_weight'])],
+        'state_sales': [{'state': str(state), 'package_weight': round(float(weight), 4)}
+                        for state, weight in zip(aggregates['state_sales']['Ship State'],
+                                                 aggregates['state_sales']['package_weight'])],
+        'origin_sales': [{'origin': str(origin), 'package_weight': round(float(weight), 4), 'orders': int(orders)}
+                         for origin, weight, orders in aggregates['origin_sales'].itertuples(index=False)],
+    }
+
+
+class ServiceMetrics:
+    """Request counts, latency percentiles and throughput since the server started."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.statuses = {}
+        self.orders = 0
+        self.rejected = 0
+
+    def record(self, status, seconds, orders=0):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.orders += orders
+            if status == HTTPStatus.OK:
+                self.latencies.append(seconds)
+            elif status == HTTPStatus.SERVICE_UNAVAILABLE:
+                self.rejected += 1
+
+    def snapshot(self, in_flight, capacity):
+        with self.lock:
+            uptime = time.time() - self.started
+            latencies = np.array(self.latencies)
+            completed = self.statuses.get(HTTPStatus.OK, 0)
+            snapshot = {
+                'uptime_seconds': round(uptime, 3),
+                'requests': {str(int(status)): count for status, count in sorted(self.statuses.items())},
+                'rejected': self.rejected,
+                'in_flight': in_flight,
+                'capacity': capacity,
+                'orders_processed': self.orders,
+                'throughput': {
+                    'requests_per_sec': round(completed / uptime, 4) if uptime else None,
+                    'orders_per_sec': round(self.orders / uptime, 2) if uptime else None,
+                },
+            }
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            snapshot['latency_seconds'] = {'p50': round(p50, 4), 'p95': round(p95, 4), 'p99': round(p99, 4),
+                                           'max': round(float(latencies.max()), 4), 'window': len(latencies)}
+        return snapshot
+
+
+class WasteService:
+    """Bounded worker pool running analyses.
+
+    Callers ``reserve`` a slot first (False when the pool is full) and then either
+    ``submit`` the work, which frees the slot when it finishes, or ``release`` it.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE, distance_cache=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="waste-api")
+        self.capacity = workers + queue_size
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.distance_cache = distance_cache
+        self.metrics = ServiceMetrics()
+
+    def reserve(self):
+        if not self.slots.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def _run(self, body, origin, category, service, chunksize):
+        try:
+            source = io.BytesIO(body)
+            if chunksize:
+                return analyze_streaming(source, origin, category, chunksize, self.distance_cache,
+                                         compact=True, service=service)
+            return analyze(source, origin, category, self.distance_cache, compact=True, service=service)[1]
+        finally:
+            self.release()
+
+    def submit(self, body, origin, category, service=DEFAULT_SERVICE, chunksize=None):
+        """Run an analysis in a slot taken with ``reserve``; returns its future."""
+        try:
+            return self.pool.submit(self._run, body, origin, category, service, chunksize)
+        except BaseException:
+            self.release()
+            raise
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "WasteAPI/1.0"
+
+    @property
+    def service(self):
+        return self.server.waste_service
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(HTTPStatus.OK, {'status': 'ok'})
+        elif path == "/metrics":
+            self._send_json(HTTPStatus.OK, self.service.metrics.snapshot(self.service.in_flight,
+                                                                         self.service.capacity))
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"No such endpoint: {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        status, payload, headers, orders = self._analyze()
+        self.service.metrics.record(status, time.perf_counter() - start, orders)
+        if status == HTTPStatus.OK:
+            payload['seconds'] = round(time.perf_counter() - start, 4)
+        self._send_json(status, payload, headers)
+
+    def _analyze(self):
+        """``(status, payload, headers, orders)`` for a POST."""
+        url = urlparse(self.path)
+        if url.path != "/analyze":
+            return HTTPStatus.NOT_FOUND, {'error': f"No such endpoint: {url.path}"}, None, 0
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        missing = [name for name in ("origin", "category") if not params.get(name)]
+        if missing:
+            return HTTPStatus.BAD_REQUEST, {'error': f"Missing query parameters: {', '.join(missing)}"}, None, 0
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            chunksize = int(params["chunksize"]) if params.get("chunksize") else None
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': "Content-Length and chunksize must be integers"}, None, 0
+        if length <= 0:
+            return HTTPStatus.BAD_REQUEST, {'error': "Send the orders CSV as the request body"}, None, 0
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': f"Body over {MAX_BODY_BYTES} bytes"}, None, 0
+        # Take a pool slot before reading the body, so a rejected request never holds an upload
+        if not self.service.reserve():
+            self.close_connection = True  # its body is left unread
+            return (HTTPStatus.SERVICE_UNAVAILABLE, {'error': "Server busy, retry later"},
+                    {"Retry-After": "1"}, 0)
+        try:
+            body = self.rfile.read(length)
+        except BaseException:
+            self.service.release()
+            raise
+        future = self.service.submit(body, params["origin"], params["category"],
+                                     params.get("service", DEFAULT_SERVICE), chunksize)
+        try:
+            aggregates = future.result(timeout=REQUEST_TIMEOUT)
+        except ValueError as exc:  # bad ZIP, category, service or CSV columns
+            return HTTPStatus.BAD_REQUEST, {'error': str(exc)}, None, 0
+        except Exception as exc:
+            logger.exception("analysis failed")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(exc).__name__}: {exc}"}, None, 0
+        return HTTPStatus.OK, result_payload(aggregates), None, aggregates['order_count']
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE,
+                distance_cache=None):
+    """A ready-to-serve HTTP server on a loopback ``host`` (port 0 picks a free port)."""
+    if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+        raise ValueError(f"The API only listens on loopback addresses, got {host}")
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.waste_service = WasteService(workers, queue_size, distance_cache)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the waste estimation pipeline over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="loopback address to bind (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="analyses run at once")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE, help="analyses that may wait for a worker")
+    parser.add_argument("--no-cache", action="store_true", help="don't use the on-disk distance cache")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    start_warmup(load_postal_index, load_rate_store)
+    server = make_server(args.host, args.port, args.workers, args.queue,
+                         None if args.no_cache else DistanceCache())
+    print(f"serving on http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.waste_service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Run the waste engine for many sellers in parallel.
+
+    python batch.py jobs.csv --out batch_results --workers 8
+
+``jobs.csv`` has one row per seller with the columns ``seller``, ``orders_csv``,
+``origin_zip`` and ``category``. Each seller gets its own
+``<seller>_orders/_monthly/_states.csv`` files and ``summary.csv`` combines them.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from distance_cache import DistanceCache
+from geo import load_postal_index
+from rates import load_rate_store
+from waste_engine import process_file
+
+JOB_COLUMNS = ["seller", "orders_csv", "origin_zip", "category"]
+
+# Set once per worker process by _init_worker
+_worker_cache = None
+
+
+def load_jobs(path):
+    jobs = pd.read_csv(path, dtype=str).fillna("")
+    missing = [col for col in JOB_COLUMNS if col not in jobs.columns]
+    if missing:
+        raise ValueError(f"{path} is missing job columns: {', '.join(missing)}")
+    return jobs[JOB_COLUMNS].to_dict("records")
+
+
+def _init_worker(use_cache):
+    global _worker_cache
+    # With fork the parent already loaded the postal data and rate tables and the
+    # workers share those pages; with spawn each worker loads them once here.
+    load_postal_index()
+    load_rate_store()
+    _worker_cache = DistanceCache() if use_cache else None
+
+
+def _run_job(job, out_dir, chunksize):
+    start = time.perf_counter()
+    error = ""
+    try:
+        row = process_file(job["orders_csv"], job["origin_zip"], job["category"], out_dir,
+                           name=job["seller"], distance_cache=_worker_cache, chunksize=chunksize)
+    except Exception as exc:  # one bad file shouldn't sink the whole batch
+        row = {"file": os.path.basename(job["orders_csv"]), "orders": 0, "total_waste_lbs": float("nan")}
+        error = f"{type(exc).__name__}: {exc}"
+    return {"seller": job["seller"], "origin_zip": job["origin_zip"], "category": job["category"],
+            **row, "seconds": round(time.perf_counter() - start, 3), "error": error}
+
+
+def run_batch(jobs, out_dir, workers=None, chunksize=None, use_cache=True):
+    """Process every job on a process pool and write ``summary.csv``; returns the summary."""
+    os.makedirs(out_dir, exist_ok=True)
+    # Warm the shared data before the pool starts so forked workers inherit it,
+    # and so a stale rate store is rebuilt once here rather than in every worker
+    load_postal_index()
+    load_rate_store()
+    context = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(use_cache,)) as pool:
+        futures = [pool.submit(_run_job, job, out_dir, chunksize) for job in jobs]
+        rows = []
+        for future in futures:
+            row = future.result()
+            rows.append(row)
+            status = row["error"] or f"{row['orders']} orders, {row['total_waste_lbs']:.2f} lbs"
+            print(f"{row['seller']}: {status} ({row['seconds']}s)", file=sys.stderr)
+
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate packaging waste for many sellers in parallel.")
+    parser.add_argument("jobs", help="CSV with columns: " + ", ".join(JOB_COLUMNS))
+    parser.add_argument("--out", default="batch_results", help="output directory (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream each CSV in chunks of this many rows")
+    parser.add_argument("--no-cache", action="store_true", help="don't use the on-disk distance cache")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(load_jobs(args.jobs), args.out, args.workers, args.chunksize, not args.no_cache)
+    return 1 if (summary["error"] != "").any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Time each stage of the waste estimation on synthetic orders of growing size.
+
+    python -m benchmarks.bench_stages --out bench.json
+    python -m benchmarks.bench_stages --sizes 1000 100000 --compact --out compact.json
+    python -m benchmarks.bench_stages --compare before.json after.json
+
+Run from the repository root. Generated CSVs are kept in ``benchmarks/data`` and
+reused. Results are written as JSON (one record per size and stage, plus the
+versions and commit they were measured on) so runs can be compared between
+versions with ``--compare``.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_orders import write_orders
+from geo import distance_category, distance_miles, load_postal_index
+from rates import load_rate_store
+from waste_engine import load_orders, monthly_totals, packaging_column, prepare_orders, state_totals, weight_columns
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+STAGES = ["csv_parse", "distance", "zone_binning", "match_weight", "packaging",
+          "monthly_resample", "state_groupby", "cumulative_sum"]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def orders_csv(rows, seed=0):
+    """Path of the synthetic CSV with ``rows`` orders, generating it on first use."""
+    path = os.path.join(DATA_DIR, f"orders_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        print(f"generating {rows} orders -> {path}", file=sys.stderr)
+        write_orders(rows, path, seed)
+    return path
+
+
+def time_stages(path, zipcode_from="10001", category="Clothing", compact=False):
+    """Seconds per stage for one pass over the orders in ``path``."""
+    timings = {}
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    df_order = timed("csv_parse", lambda: prepare_orders(load_orders(path, compact)))
+    miles = timed("distance", distance_miles, zipcode_from, df_order['zipcode_to'])
+    zones = timed("zone_binning", distance_category, miles)
+    weights = timed("match_weight", weight_columns, df_order, zones)
+    df_order['package_weight'] = timed("packaging", packaging_column, weights['matched_weight'], category)
+    timed("monthly_resample", monthly_totals, df_order)
+    timed("state_groupby", state_totals, df_order)
+    timed("cumulative_sum", lambda: df_order['package_weight'].cumsum())
+    return timings
+
+
+def run(sizes, repeat=1, compact=False, seed=0):
+    # keep the one-off dataset loads out of the stage timings
+    load_postal_index()
+    load_rate_store()
+    results = []
+    for rows in sizes:
+        path = orders_csv(rows, seed)
+        runs = [time_stages(path, compact=compact) for _ in range(repeat)]
+        for stage in STAGES:
+            seconds = min(timings[stage] for timings in runs)
+            results.append({"rows": rows, "stage": stage, "seconds": round(seconds, 6),
+                            "rows_per_sec": round(rows / seconds) if seconds > 0 else None})
+            print(f"{rows:>10} {stage:<18} {seconds:10.4f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "compact": compact,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(before, after):
+    """Per (rows, stage) timings of two result files and the after/before ratio."""
+    frames = []
+    for label, path in (("before", before), ("after", after)):
+        with open(path) as fh:
+            frames.append(pd.DataFrame(json.load(fh)["results"]).set_index(["rows", "stage"])["seconds"].rename(label))
+    table = pd.concat(frames, axis=1)
+    table["ratio"] = (table["after"] / table["before"]).round(3)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the waste estimation stages on synthetic orders.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="order counts to benchmark (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="passes per size; the fastest is kept")
+    parser.add_argument("--compact", action="store_true", help="load orders column-pruned with compact dtypes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file (default: %(default)s)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="print the timings of two result files side by side instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(compare(*args.compare).to_string())
+        return 0
+    report = run(args.sizes, args.repeat, args.compact, args.seed)
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
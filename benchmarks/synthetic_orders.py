@@ -0,0 +1,100 @@
+"""Synthetic Etsy-style Sold Orders CSVs for benchmarking.
+
+    python -m benchmarks.synthetic_orders 1000000 orders_1m.csv
+
+Destination ZIPs (and their states) are drawn from the ZIP centroid store (real postal data),
+skewed towards a few hundred popular ZIPs like a real shop's buyers; a few orders
+use ZIP+4, unknown ZIPs or ship to Canada. Shipping charges follow the USPS price
+range and sale dates spread over one year.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from geo import load_postal_index
+
+# Extra Sold Orders columns the model never reads, so parsing cost is realistic
+_FILLER_COLUMNS = {
+    'Buyer': "buyer",
+    'Ship Name': "Jane Doe",
+    'Ship Address1': "123 Main St",
+    'Payment Method': "Credit Card",
+}
+_CANADIAN_PROVINCES = ["ON", "QC", "BC", "AB", "MB", "NS"]
+_CANADIAN_POSTCODES = ["M5V 3L9", "H2X 1Y4", "V6B 1A1", "T2P 2M5", "R3C 4T3", "B3H 1W5"]
+_WRITE_CHUNK = 1_000_000
+
+
+def _destinations(postal_index):
+    data = postal_index.to_frame()  # one row per postal code
+    return data['postal_code'].to_numpy(dtype=str), data['state_code'].fillna("").to_numpy(dtype=str)
+
+
+def generate_orders(n, seed=0, start="2024-01-01", days=365, postal_index=None):
+    """A DataFrame of ``n`` synthetic sold orders."""
+    rng = np.random.default_rng(seed)
+    zips, states = _destinations(postal_index or load_postal_index())
+
+    # Zipf-like popularity: most orders go to a small share of the ZIPs
+    popularity = 1.0 / np.arange(1, len(zips) + 1) ** 0.8
+    picks = rng.choice(len(zips), n, p=popularity / popularity.sum())
+    ship_zip = zips[picks].astype(object)
+    ship_state = states[picks].astype(object)
+
+    plus4 = rng.random(n) < 0.05
+    ship_zip[plus4] = ship_zip[plus4] + "-" + rng.integers(1000, 9999, plus4.sum()).astype(str)
+    unknown = rng.random(n) < 0.002
+    ship_zip[unknown] = "00000"
+    canada = rng.random(n) < 0.03
+    province = rng.integers(0, len(_CANADIAN_PROVINCES), canada.sum())
+    ship_zip[canada] = np.array(_CANADIAN_POSTCODES)[province]
+    ship_state[canada] = np.array(_CANADIAN_PROVINCES)[province]
+
+    # Buyer-paid shipping in cents: mostly $4-$20, a long tail of heavy parcels, some free
+    shipping = np.round(rng.lognormal(np.log(8.5), 0.55, n), 2)
+    shipping[rng.random(n) < 0.04] = 0.0
+
+    minutes = rng.integers(0, days * 24 * 60, n)
+    sale_date = pd.Timestamp(start) + pd.to_timedelta(minutes, unit="min")
+
+    return pd.DataFrame({
+        'Sale Date': sale_date.strftime("%m/%d/%y"),
+        'Order ID': rng.permutation(n) + 1_000_000_000,
+        **{col: value for col, value in _FILLER_COLUMNS.items()},
+        'Ship Zipcode': ship_zip,
+        'Ship State': ship_state,
+        'Ship Country': np.where(canada, "Canada", "United States"),
+        'Order Shipping': shipping,
+        'Order Value': np.round(rng.lognormal(np.log(30), 0.7, n), 2),
+    })
+
+
+def write_orders(n, path, seed=0, postal_index=None):
+    """Write ``n`` synthetic orders to ``path`` a million rows at a time."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    while written < n:
+        rows = min(_WRITE_CHUNK, n - written)
+        chunk = generate_orders(rows, seed=seed + written, postal_index=postal_index)
+        chunk['Order ID'] += written
+        chunk.to_csv(path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+        written += rows
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Sold Orders CSV.")
+    parser.add_argument("rows", type=int, help="number of orders")
+    parser.add_argument("path", help="output CSV path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_orders(args.rows, args.path, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
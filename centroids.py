@@ -0,0 +1,142 @@
+"""Offline ZIP centroid store used by the distance step.
+
+    python centroids.py build                   # from pgeocode (downloads its data)
+    python centroids.py build --source US.txt   # from a GeoNames postal code file
+    python centroids.py info
+
+One ``.npy`` record array sorted by ZIP: ``zip`` (uint32), ``lat`` / ``lon``
+(float32, mean over the places sharing the ZIP, as pgeocode does) and ``state``
+(2-letter code). It is about 0.6 MB for the US, memory-mapped at load and
+searched with ``np.searchsorted``, so distances need no network access and no
+text parsing. Loading never builds the store: run ``python centroids.py build``
+once per deployment (the dev container does it on creation; it is the only step
+that may touch the network) and ship ``geodata/zip_centroids_us.npy`` with
+air-gapped ones.
+"""
+import argparse
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CENTROID_STORE_PATH = os.environ.get(
+    "WASTE_CENTROID_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geodata", "zip_centroids_us.npy"))
+CENTROID_DTYPE = np.dtype([("zip", "<u4"), ("lat", "<f4"), ("lon", "<f4"), ("state", "S2")])
+# Column positions in the tab-separated GeoNames postal code dumps (no header)
+_GEONAMES_COLUMNS = {1: "postal_code", 4: "state_code", 9: "latitude", 10: "longitude"}
+
+
+class CentroidStore:
+    """Latitude/longitude lookups over a ZIP-sorted centroid record array."""
+
+    def __init__(self, records):
+        self.records = records
+        self.zips = records["zip"]
+
+    def __len__(self):
+        return len(self.records)
+
+    @functools.cached_property
+    def version(self):
+        """Short hash of the records, which changes whenever the store is rebuilt with other data."""
+        return hashlib.sha1(np.ascontiguousarray(self.records).tobytes()).hexdigest()[:12]
+
+    def positions(self, zipcodes):
+        """Row of each ZIP string in the store, -1 if it is unknown or not 5 digits."""
+        zips = np.asarray(zipcodes, dtype=str)
+        valid = np.char.isdigit(zips) & (np.char.str_len(zips) == 5)
+        keys = zips[valid].astype(np.uint32)
+        rows = np.searchsorted(self.zips, keys)
+        found = rows < len(self.zips)
+        found[found] = self.zips[rows[found]] == keys[found]
+        positions = np.full(zips.shape, -1, dtype=np.intp)
+        positions[np.flatnonzero(valid)[found]] = rows[found]
+        return positions
+
+    def coords(self, zipcodes):
+        """(n, 2) float array of [latitude, longitude]; NaN for unknown ZIPs."""
+        positions = self.positions(zipcodes)
+        coords = np.full((len(positions), 2), np.nan)
+        known = positions >= 0
+        coords[known, 0] = self.records["lat"][positions[known]]
+        coords[known, 1] = self.records["lon"][positions[known]]
+        return coords
+
+    def to_frame(self):
+        """The store as ``postal_code`` / ``latitude`` / ``longitude`` / ``state_code`` columns."""
+        return pd.DataFrame({
+            "postal_code": np.char.zfill(self.zips.astype(str), 5),
+            "latitude": self.records["lat"].astype(float),
+            "longitude": self.records["lon"].astype(float),
+            "state_code": self.records["state"].astype(str),
+        })
+
+
+def _records(data):
+    """Centroid records from a frame with postal_code, latitude, longitude, state_code."""
+    data = data[data["latitude"].notna() & data["postal_code"].astype(str).str.fullmatch(r"\d{5}")]
+    grouped = data.groupby(data["postal_code"].astype(np.uint32), sort=True)
+    means = grouped[["latitude", "longitude"]].mean()
+    records = np.empty(len(means), dtype=CENTROID_DTYPE)
+    records["zip"] = means.index.to_numpy()
+    records["lat"] = means["latitude"].to_numpy()
+    records["lon"] = means["longitude"].to_numpy()
+    records["state"] = grouped["state_code"].first().fillna("").to_numpy(dtype=str)
+    return records
+
+
+def build_centroids(source=None, country="us"):
+    """Centroid records from a GeoNames postal code file, or from pgeocode's copy if ``source`` is None."""
+    if source is None:
+        import pgeocode  # only needed to build the store, and it may hit the network
+        data = pgeocode.Nominatim(country)._data_frame
+    else:
+        data = pd.read_csv(source, sep="\t", header=None, usecols=list(_GEONAMES_COLUMNS),
+                           dtype={1: str, 4: str}, keep_default_na=False, na_values=[""])
+        data = data.rename(columns=_GEONAMES_COLUMNS)
+    return _records(data)
+
+
+def save_centroids(records, path=CENTROID_STORE_PATH):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    fh = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with fh:
+            np.save(fh, records)
+        os.replace(fh.name, path)
+    except BaseException:
+        os.remove(fh.name)
+        raise
+
+
+@functools.lru_cache(maxsize=None)
+def load_centroids(path=CENTROID_STORE_PATH):
+    """Memory-map the centroid store; it must have been built with ``python centroids.py build``."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No ZIP centroid store at {path}. Build it once with `python centroids.py build` "
+                                f"(or `--source US.txt` from a GeoNames file), or point WASTE_CENTROID_STORE at one.")
+    return CentroidStore(np.load(path, mmap_mode="r"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the offline ZIP centroid store.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--source", help="GeoNames postal code file (e.g. US.txt); default: pgeocode's data")
+    parser.add_argument("--out", default=CENTROID_STORE_PATH, help="store path (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        save_centroids(build_centroids(args.source), args.out)
+    store = load_centroids(args.out)
+    print(f"{args.out}: {len(store)} ZIPs, {os.path.getsize(args.out) / 1e6:.2f} MB, version {store.version}",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
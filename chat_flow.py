@@ -0,0 +1,133 @@
+"""Compiled conversation flow and bounded chat history for the chatbot.
+
+    flow = compile_flow(FLOW)        # raises ValueError on a broken graph
+    history = ChatHistory(max_messages=50, spill_dir=CHAT_SPILL_DIR)
+    history.append("assistant", flow["start"].text)
+    st.download_button("Export transcript", data=history.transcript, ...)
+
+``FLOW`` dicts are checked once, when compiled: every node needs text, every
+option a label and a target, and every target (options and form submits)
+must be a node of the flow. The result is a read-only table of ``ChatNode``
+tuples, so the apps compile it once per process and share it.
+
+``ChatHistory`` keeps only the newest ``max_messages`` messages in memory.
+With a ``spill_dir``, older messages are appended to a JSON-lines file there
+instead of being dropped, so the exported transcript is still complete; the
+file is removed on ``clear()`` or when the history is garbage-collected.
+``transcript`` builds the text on demand, which is what the download button
+calls, only when the user actually downloads.
+"""
+import json
+import os
+import uuid
+import weakref
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+from distance_cache import CACHE_DIR
+
+START_NODE = "start"
+CHAT_HISTORY_LIMIT = 50
+CHAT_SPILL_DIR = os.path.join(CACHE_DIR, "chat")
+
+ChatNode = namedtuple("ChatNode", ["id", "text", "options", "form"])
+ChatOption = namedtuple("ChatOption", ["label", "next"])
+
+
+def _flow_errors(flow):
+    """Every problem with a FLOW dict, as readable strings."""
+    errors = []
+    if START_NODE not in flow:
+        errors.append(f"no {START_NODE!r} node")
+    for node_id, node in flow.items():
+        if not isinstance(node.get("text"), str):
+            errors.append(f"{node_id}: text must be a string, got {type(node.get('text')).__name__}")
+        for i, option in enumerate(node.get("options", [])):
+            if not option.get("label"):
+                errors.append(f"{node_id}: option {i} has no label")
+            if option.get("next") not in flow:
+                errors.append(f"{node_id}: option {option.get('label')!r} points to missing node {option.get('next')!r}")
+        form = node.get("form")
+        if form is not None:
+            if form.get("next_on_submit") not in flow:
+                errors.append(f"{node_id}: form submits to missing node {form.get('next_on_submit')!r}")
+            for i, field in enumerate(form.get("fields", [])):
+                if not field.get("key") or not field.get("label"):
+                    errors.append(f"{node_id}: form field {i} needs a key and a label")
+    return errors
+
+
+def compile_flow(flow):
+    """Validate a FLOW dict and return it as a read-only ``{node_id: ChatNode}`` table."""
+    errors = _flow_errors(flow)
+    if errors:
+        raise ValueError("Invalid chat flow:\n  " + "\n  ".join(errors))
+    return MappingProxyType({
+        node_id: ChatNode(node_id, node["text"],
+                          tuple(ChatOption(option["label"], option["next"]) for option in node.get("options", [])),
+                          node.get("form"))
+        for node_id, node in flow.items()
+    })
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ChatHistory:
+    """The newest ``max_messages`` chat messages, optionally spilling older ones to disk."""
+
+    def __init__(self, max_messages=CHAT_HISTORY_LIMIT, spill_dir=None):
+        self.messages = deque(maxlen=max_messages)
+        self.spill_path = None
+        self.spilled = 0
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_path = os.path.join(spill_dir, f"chat-{uuid.uuid4().hex}.jsonl")
+            self._finalizer = weakref.finalize(self, _remove, self.spill_path)
+
+    def __len__(self):
+        return self.spilled + len(self.messages)
+
+    def __iter__(self):
+        """Messages still in memory, oldest first."""
+        return iter(self.messages)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def append(self, role, content):
+        if len(self.messages) == self.messages.maxlen:
+            self._spill(self.messages[0])
+        self.messages.append({"role": role, "content": content})
+
+    def recent(self, count):
+        """The last ``count`` messages in memory."""
+        return list(self.messages)[-count:]
+
+    def clear(self):
+        self.messages.clear()
+        self.spilled = 0
+        if self.spill_path is not None:
+            _remove(self.spill_path)
+
+    def _spill(self, message):
+        if self.spill_path is None:
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(message) + "\n")
+        self.spilled += 1
+
+    def _all_messages(self):
+        if self.spilled:
+            with open(self.spill_path, encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+        yield from list(self.messages)
+
+    def transcript(self):
+        """The whole conversation as ``role: content`` lines (spilled messages included)."""
+        return "\n".join(f'{m["role"]}: {m["content"]}' for m in self._all_messages())
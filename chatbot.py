@@ -1,4 +1,5 @@
 import streamlit as st
+from chat_flow import CHAT_SPILL_DIR, ChatHistory, compile_flow
 
 st.divider()
 
@@ -29,12 +30,12 @@ FLOW = {
         "• **Honeycomb Mailers** – paper-based padded mailers that replace plastic bubble mailers. Fully recyclable and perfect for jewelry, accessories, and clothing\n" 
         "• **Compostable Mailers** – made from cornstarch or PLA, these decompose naturally and replace traditional poly mailers\n"
         "• **Cardboard Boxes** – sturdy, biodegradable boxes ideal for fragile home decor or art\n"
-        "• **Rigid Paper Mailers** – great for art prints, books, and documents — recyclable and plastic-free",
+        "• **Rigid Paper Mailers** – great for art prints, books, and documents — recyclable and plastic-free\n"
         "• **Paper Envelopes** – lightweight, recyclable mailers made from kraft paper. Perfect for flat items such as greeting cards, small prints, or stickers."
         ),
         "options": [
-            {"label": "See pricing", "next": "pricing"},
-            {"label": "<- Back to Products", "next": "product_info"},
+            {"label": "See pricing", "next": "contact"},
+            {"label": "<- Back to Products", "next": "product_catalog"},
         ],
     },
     "inner_packaging": {
@@ -46,8 +47,8 @@ FLOW = {
             "• **Mushroom Packaging** – grown from mycelium and compostable, perfect for glass or ceramic goods."
         ),
         "options": [
-            {"label": "See pricing", "next": "pricing"},
-            {"label": "<- Back to Products", "next": "product_info"},
+            {"label": "See pricing", "next": "contact"},
+            {"label": "<- Back to Products", "next": "product_catalog"},
         ],
     },
     "product_wrapping_containers": {
@@ -60,8 +61,8 @@ FLOW = {
             "• **Cardboard Tubes / Boxes** – used for art, posters, or apparel — fully recyclable."
         ),
         "options": [
-            {"label": "See pricing", "next": "pricing"},
-            {"label": "<- Back to Products", "next": "product_info"},
+            {"label": "See pricing", "next": "contact"},
+            {"label": "<- Back to Products", "next": "product_catalog"},
         ],
     },
     "sealing_labeling": {
@@ -73,8 +74,8 @@ FLOW = {
             "• **Hemp Twine** – replaces plastic string for rustic and eco branding."
         ),
         "options": [
-            {"label": "Get a quote", "next": "quote_form"},
-            {"label": "<- Back to Products", "next": "start"},
+            {"label": "Get a quote", "next": "contact"},
+            {"label": "<- Back to Products", "next": "product_catalog"},
         ],
     },
     "inserts_extras": {
@@ -86,8 +87,8 @@ FLOW = {
             "• **QR Code Cards** – encourage paperless communication by linking to digital care instructions or sustainability stories."
         ),
         "options": [
-            {"label": "Get a quote", "next": "quote_form"},
-            {"label": "<- Back to Products", "next": "start"},
+            {"label": "Get a quote", "next": "contact"},
+            {"label": "<- Back to Products", "next": "product_catalog"},
         ],
     },
 
@@ -106,9 +107,16 @@ FLOW = {
     },
 }
 
+# Checked and compiled once per process; a broken FLOW fails here, not on a click.
+@st.cache_resource
+def chat_flow():
+    return compile_flow(FLOW)
+
+
 # ---------- Session state ----------
+# Bounded history: older messages go to a spill file so the transcript stays complete
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = ChatHistory(spill_dir=CHAT_SPILL_DIR)
 if "current_node" not in st.session_state:
     st.session_state.current_node = "start"
 if "form_data" not in st.session_state:
@@ -116,11 +124,11 @@ if "form_data" not in st.session_state:
 
 def go(node_id: str):
     st.session_state.current_node = node_id
-    node = FLOW[node_id]
-    st.session_state.history.append({"role": "assistant", "content": node["text"]})
+    node = chat_flow()[node_id]
+    st.session_state.history.append("assistant", node.text)
 
 def reset_chat():
-    st.session_state.history = []
+    st.session_state.history.clear()
     st.session_state.current_node = "start"
     st.session_state.form_data = {}
     go("start")
@@ -139,7 +147,7 @@ def render_chat_ui():
     with c2:
         st.download_button(
             "⬇️ Export transcript",
-            data="\n".join([f'{m["role"]}: {m["content"]}' for m in st.session_state.history]),
+            data=st.session_state.history.transcript,  # built only when downloaded
             file_name="chat_transcript.txt",
             use_container_width=True
         )
@@ -147,18 +155,18 @@ def render_chat_ui():
     st.divider()
 
     # History
-    for m in st.session_state.history[-12:]:
+    for m in st.session_state.history.recent(12):
         with st.chat_message(m["role"]):
             st.markdown(m["content"])
 
     node_id = st.session_state.current_node
-    node = FLOW[node_id]
+    node = chat_flow()[node_id]
 
     # Optional form
-    if "form" in node:
+    if node.form:
         with st.chat_message("assistant"):
-            st.markdown(node["text"])
-            form_cfg = node["form"]
+            st.markdown(node.text)
+            form_cfg = node.form
             with st.form("mini_chat_form", clear_on_submit=False):
                 data = st.session_state.form_data.setdefault(node_id, {})
                 for field in form_cfg["fields"]:
@@ -182,20 +190,20 @@ def render_chat_ui():
                         st.warning("Please fill: " + ", ".join(missing))
                     else:
                         summary = ", ".join(f"{f['label']}: {data.get(f['key'])}" for f in form_cfg["fields"])
-                        st.session_state.history.append({"role": "user", "content": f"(submitted) {summary}"})
+                        st.session_state.history.append("user", f"(submitted) {summary}")
                         go(form_cfg["next_on_submit"])
                         st.rerun()
 
     # Options as buttons
-    if "options" in node and node["options"]:
+    if node.options:
         with st.chat_message("assistant"):
             st.caption("Choose an option:")
-            cols = st.columns(min(3, len(node["options"])))
-            for i, opt in enumerate(node["options"]):
+            cols = st.columns(min(3, len(node.options)))
+            for i, opt in enumerate(node.options):
                 col = cols[i % len(cols)]
-                if col.button(opt["label"], key=f"opt_{node_id}_{i}", use_container_width=True):
-                    st.session_state.history.append({"role": "user", "content": opt["label"]})
-                    go(opt["next"])
+                if col.button(opt.label, key=f"opt_{node_id}_{i}", use_container_width=True):
+                    st.session_state.history.append("user", opt.label)
+                    go(opt.next)
                     st.rerun()
     else:
         with st.chat_message("assistant"):
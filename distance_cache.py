@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from geo import (
+    distance_category,
+    distance_miles,
+    factorize_pairs,
+    factorize_zips,
+    pair_distance_miles,
+    postal_index_version,
+)
+
+CACHE_DIR = os.environ.get("WASTE_CACHE_DIR", ".waste_cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "distances.sqlite")
+DEFAULT_MAX_ENTRIES = 500_000
+
+# SQLite caps the number of bound parameters per statement
+_BATCH = 900
+
+
+class DistanceCache:
+    """Persistent (source, origin ZIP, destination ZIP) -> (distance_miles, distance_cat) cache.
+
+    Backed by a local SQLite file so repeat runs for the same origin skip geocoding.
+    ``source`` is the version of the geocoding data the pairs were computed from
+    (see ``geo.postal_index_version``); switching to another source drops the pairs
+    of every other one. Least recently used pairs are evicted once more than
+    ``max_entries`` are stored. ``hits`` / ``misses`` count unique pairs looked up
+    through this instance.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._source = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS distances ("
+                " source TEXT NOT NULL,"
+                " origin TEXT NOT NULL,"
+                " dest TEXT NOT NULL,"
+                " distance_miles REAL,"
+                " distance_cat INTEGER NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (source, origin, dest)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON distances (last_used)")
+
+    def _connect(self):
+        # Streamlit reruns may land on a different thread, so never share a connection
+        return sqlite3.connect(self.path, timeout=30)
+
+    def use_source(self, source):
+        """Look pairs up for geocoding data ``source``, dropping those of any other source."""
+        if source == self._source:
+            return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM distances WHERE source != ?", (source,))
+        self._source = source
+
+    def get_many(self, origin, dests):
+        """Return {dest: (distance_miles, distance_cat)} for the cached pairs."""
+        found = {}
+        dests = list(dests)
+        now = time.time()
+        with self._connect() as conn:
+            for start in range(0, len(dests), _BATCH):
+                batch = dests[start:start + _BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT dest, distance_miles, distance_cat FROM distances "
+                    f"WHERE source = ? AND origin = ? AND dest IN ({marks})",
+                    [self._source, origin, *batch],
+                ).fetchall()
+                for dest, miles, cat in rows:
+                    found[dest] = (np.nan if miles is None else miles, cat)
+                conn.executemany(
+                    "UPDATE distances SET last_used = ? WHERE source = ? AND origin = ? AND dest = ?",
+                    [(now, self._source, origin, dest) for dest, _, _ in rows],
+                )
+        self.hits += len(found)
+        self.misses += len(dests) - len(found)
+        return found
+
+    def put_many(self, origin, dests, miles, cats):
+        """Store pairs for one origin, then evict the oldest entries over the limit."""
+        now = time.time()
+        rows = [
+            (self._source, origin, dest, None if np.isnan(m) else float(m), int(c), now)
+            for dest, m, c in zip(dests, miles, cats)
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO distances "
+                "(source, origin, dest, distance_miles, distance_cat, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            excess = self._count(conn) - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM distances WHERE (source, origin, dest) IN ("
+                    " SELECT source, origin, dest FROM distances ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    @staticmethod
+    def _count(conn):
+        return conn.execute("SELECT COUNT(*) FROM distances").fetchone()[0]
+
+    def __len__(self):
+        with self._connect() as conn:
+            return self._count(conn)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM distances")
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+
+def cached_distances(zipcode_from, zipcodes_to, cache, postal_index=None):
+    """Per-row (distance_miles, distance_cat) arrays, geocoding only uncached pairs."""
+    cache.use_source(postal_index_version(postal_index))
+    codes, uniques = factorize_zips(zipcodes_to)
+    uniques = list(uniques)
+
+    found = cache.get_many(zipcode_from, uniques)
+    missing = [dest for dest in uniques if dest not in found]
+    if missing:
+        miles = distance_miles(zipcode_from, missing, postal_index)
+        cats = distance_category(miles)
+        cache.put_many(zipcode_from, missing, miles, cats)
+        found.update(zip(missing, zip(miles, cats)))
+
+    unique_miles = np.array([found[dest][0] for dest in uniques], dtype=float)
+    unique_cats = np.array([found[dest][1] for dest in uniques], dtype=int)
+    return unique_miles[codes], unique_cats[codes]
+
+
+def cached_pair_distances(zipcodes_from, zipcodes_to, cache, postal_index=None):
+    """Like ``cached_distances`` for per-row origins; all uncached pairs are geocoded in one pass."""
+    cache.use_source(postal_index_version(postal_index))
+    codes, origins, dests = factorize_pairs(zipcodes_from, zipcodes_to)
+    pair_miles = np.empty(len(origins), dtype=float)
+    pair_cats = np.empty(len(origins), dtype=int)
+
+    missing = np.ones(len(origins), dtype=bool)
+    for origin in np.unique(origins):
+        rows = np.flatnonzero(origins == origin)
+        found = cache.get_many(origin, dests[rows])
+        for row in rows:
+            if dests[row] in found:
+                pair_miles[row], pair_cats[row] = found[dests[row]]
+                missing[row] = False
+
+    if missing.any():
+        miles = pair_distance_miles(origins[missing], dests[missing], postal_index)
+        cats = distance_category(miles)
+        pair_miles[missing], pair_cats[missing] = miles, cats
+        for origin in np.unique(origins[missing]):
+            rows = origins[missing] == origin
+            cache.put_many(origin, dests[missing][rows], miles[rows], cats[rows])
+    return pair_miles[codes], pair_cats[codes]
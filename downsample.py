@@ -0,0 +1,45 @@
+"""Shrink long time series before they are sent to the browser as Plotly JSON.
+
+``downsample_cumulative`` picks the points of a series over the point budget with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the visible shape of the line:
+first and last points, peaks and bends.
+"""
+import numpy as np
+
+DEFAULT_POINT_BUDGET = 2000
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the ``n_out`` points LTTB keeps from the series ``(x, y)`` (x ascending)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError(f"LTTB needs a budget of at least 3 points, got {n_out}")
+
+    # first and last point are always kept; the rest go in n_out - 2 equal buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket (the last point, after the final bucket) is the third corner
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[prev] - next_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (next_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[i + 1] = prev
+    return keep
+
+
+def downsample_cumulative(cumulative, max_points=DEFAULT_POINT_BUDGET):
+    """The ``Sale Date`` / ``Cumulative Waste`` table with at most ``max_points`` rows."""
+    if len(cumulative) <= max_points:
+        return cumulative
+    x = cumulative['Sale Date'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+    keep = lttb_indices(x, cumulative['Cumulative Waste'].to_numpy(), max_points)
+    return cumulative.iloc[keep].reset_index(drop=True)
@@ -0,0 +1,146 @@
+"""Project monthly and per-state packaging waste for the coming months.
+
+Each series (total waste, one state, one seller, ...) gets a damped-trend Holt
+model: a level and a trend updated month by month, with the trend shrunk by
+``DAMPING`` per projected month so short, noisy histories don't run away. The
+smoothing weights are picked per series from a small grid by one-step-ahead
+squared error. The recursion runs over months only; series and grid points
+are the axes of one NumPy array, so thousands of sellers fit in one pass:
+
+    history = pd.DataFrame({...})   # PeriodIndex of months x one column per series
+    forecast(history, months=6)     # next 6 months, same columns
+
+A total history shorter than ``MIN_HISTORY_MONTHS`` complete months has no
+trend to fit, so ``waste_forecast`` returns None for it instead of a forecast.
+
+Fitted models are cached per process by a hash of the series values, so
+redrawing the dashboard or re-forecasting an unchanged series skips the fit.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from waste_engine import _monthly_frame
+
+FORECAST_MONTHS = 6
+MIN_HISTORY_MONTHS = 2
+DAMPING = 0.9
+ALPHAS = np.linspace(0.1, 0.9, 9)  # level smoothing grid
+BETAS = np.array([0.05, 0.1, 0.2, 0.3])  # trend smoothing grid
+MAX_CACHED_FITS = 10_000
+
+_fits = OrderedDict()  # (months, series hash) -> (level, trend)
+_fits_lock = threading.Lock()
+
+
+def _series_keys(history):
+    """Cache key of every row of an (n_series, n_months) array, hashed in one vectorized pass."""
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(history), index=False).to_numpy()
+    return [(history.shape[1], int(value)) for value in hashes]
+
+
+def fit_holt(history):
+    """Final ``(level, trend)`` per row of an (n_series, n_months) array, fitted in one batch."""
+    history = np.asarray(history, dtype=float)
+    n_series, n_months = history.shape
+    if n_months == 0:
+        return np.zeros(n_series), np.zeros(n_series)
+    if n_months == 1:
+        return history[:, 0].copy(), np.zeros(n_series)
+
+    # (series, grid) arrays: every smoothing pair is tried on every series at once
+    alpha, beta = (grid.ravel()[None, :] for grid in np.meshgrid(ALPHAS, BETAS))
+    level = np.repeat(history[:, :1], alpha.shape[1], axis=1)
+    trend = np.repeat(history[:, 1:2] - history[:, :1], alpha.shape[1], axis=1)
+    sse = np.zeros_like(level)
+    for t in range(1, n_months):
+        observed = history[:, t:t + 1]
+        predicted = level + DAMPING * trend
+        sse += (observed - predicted) ** 2
+        new_level = alpha * observed + (1 - alpha) * predicted
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        level = new_level
+
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(n_series)
+    return level[rows, best], trend[rows, best]
+
+
+def fit_models(history):
+    """``fit_holt`` that reuses cached fits; only unseen series are fitted (in one batch)."""
+    history = np.asarray(history, dtype=float)
+    if history.size == 0:  # no series or no months: nothing to hash or cache
+        return np.column_stack(fit_holt(history))
+    keys = _series_keys(history)
+    params = np.empty((len(keys), 2))
+    with _fits_lock:
+        missing = [i for i, key in enumerate(keys) if key not in _fits]
+        for i, key in enumerate(keys):
+            if key in _fits:
+                _fits.move_to_end(key)
+                params[i] = _fits[key]
+    if missing:
+        level, trend = fit_holt(history[missing])
+        params[missing, 0], params[missing, 1] = level, trend
+        with _fits_lock:
+            for i in missing:
+                _fits[keys[i]] = tuple(params[i])
+            while len(_fits) > MAX_CACHED_FITS:
+                _fits.popitem(last=False)
+    return params
+
+
+def project(params, months=FORECAST_MONTHS):
+    """(n_series, months) projections from ``fit_models`` parameters, never below 0."""
+    steps = np.cumsum(DAMPING ** np.arange(1, months + 1))  # damped trend multiplier per month ahead
+    return np.clip(params[:, :1] + params[:, 1:2] * steps[None, :], 0, None)
+
+
+def forecast(history, months=FORECAST_MONTHS):
+    """Next ``months`` months of every column of a monthly (PeriodIndex) history frame."""
+    params = fit_models(history.to_numpy(dtype=float).T)
+    start = history.index[-1] + 1 if len(history) else pd.Period(pd.Timestamp.today(), freq='M')
+    index = pd.period_range(start, periods=months, freq='M')
+    return pd.DataFrame(project(params, months).T, index=index, columns=history.columns)
+
+
+def monthly_history(cube, by=None):
+    """Monthly waste per value of cube column ``by`` (or in total), complete months only.
+
+    Months are a PeriodIndex with gaps filled with 0. A trailing month whose last
+    day is after the latest sale date is dropped, so a partial month doesn't read
+    as a drop in waste; it is forecast instead.
+    """
+    if not len(cube):
+        return pd.DataFrame(index=pd.PeriodIndex([], freq='M'))
+    months = cube['Sale Date'].dt.to_period('M')
+    keys = [months] if by is None else [months, cube[by]]
+    sums = cube.groupby(keys, observed=True)['package_weight'].sum()
+    history = sums.to_frame('total') if by is None else sums.unstack(fill_value=0.0)
+    history = history.reindex(pd.period_range(months.min(), months.max(), freq='M'), fill_value=0.0)
+    last_day = cube['Sale Date'].max()
+    if last_day < history.index[-1].to_timestamp(how='end').normalize():
+        history = history.iloc[:-1]
+    return history
+
+
+def waste_forecast(cube, months=FORECAST_MONTHS):
+    """Projected waste for the ``months`` months after the history in ``cube``.
+
+    ``monthly`` is labelled like the ``aggregate`` monthly table; ``state_sales`` is
+    each U.S. state's projected total over the whole horizon. None when ``cube``
+    has fewer than ``MIN_HISTORY_MONTHS`` complete months.
+    """
+    history = monthly_history(cube)
+    if len(history) < MIN_HISTORY_MONTHS:
+        return None
+    total = forecast(history, months)
+    us_sales = cube[cube['Ship Country'] == 'United States']
+    by_state = forecast(monthly_history(us_sales, by='Ship State'), months)
+    states = by_state.sum().rename('package_weight').rename_axis('Ship State').reset_index()
+    return {
+        'monthly': _monthly_frame(total['total'] if 'total' in total else pd.Series(0.0, index=total.index)),
+        'state_sales': states.sort_values('package_weight', ascending=False, ignore_index=True),
+    }
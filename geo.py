@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from centroids import load_centroids
+
+KM_TO_MILES = 0.621371
+EARTH_RADIUS_KM = 6371.009  # same as pgeocode, so distances match its GeoDistance
+# Upper mileage bound for zones 1-7; anything farther is zone 8
+ZONE_MILE_LIMITS = [50, 150, 300, 600, 1000, 1400, 1800]
+
+
+# held while loading, so a background warm-up and a foreground run share one load
+_load_lock = threading.Lock()
+
+
+def load_postal_index():
+    """The memory-mapped ZIP centroid store (see centroids.py), once per process."""
+    with _load_lock:
+        return load_centroids()
+
+
+def postal_index_version(postal_index=None):
+    """Version stamp of ``postal_index`` (default: the loaded store).
+
+    Data derived from the centroids (cached distances, the zone matrix) is keyed by
+    it, so rebuilding the store with other data never serves stale miles or zones.
+    """
+    if postal_index is None:
+        postal_index = load_postal_index()
+    return postal_index.version
+
+
+def lookup_coords(postal_index, zipcodes):
+    """Return an (n, 2) float array of [latitude, longitude] for each ZIP.
+
+    Unknown ZIPs come back as NaN, same as pgeocode.
+    """
+    return postal_index.coords(list(zipcodes))
+
+
+def haversine_km(origin, dest):
+    """Great-circle km between matching rows of two (n, 2) [lat, lon] degree arrays."""
+    origin, dest = np.radians(origin), np.radians(dest)
+    dlat, dlon = (dest - origin).T
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(origin[:, 0]) * np.cos(dest[:, 0]) * np.sin(dlon / 2.0) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+
+def factorize_zips(zipcodes):
+    """``(codes, unique_zips)`` for a column of ZIP strings, reusing category codes when present."""
+    zips = pd.Series(zipcodes)
+    if isinstance(zips.dtype, pd.CategoricalDtype):
+        if zips.isna().any():
+            zips = zips.cat.add_categories([""]).fillna("")
+        zips = zips.cat.remove_unused_categories()
+        return zips.cat.codes.to_numpy(), zips.cat.categories.astype(str)
+    # missing ZIPs become "" (unknown, so NaN miles) rather than factorize's -1 code
+    return pd.factorize(zips.astype(str).fillna(""), sort=False)
+
+
+def distance_miles(zipcode_from, zipcodes_to, postal_index=None):
+    """Great-circle miles from one origin ZIP to every destination ZIP.
+
+    Each unique destination is geocoded once and all distances are computed in a
+    single NumPy haversine pass. The formula and Earth radius are pgeocode's, but
+    the centroids are stored as float32, so results differ from
+    ``GeoDistance.query_postal_code(zipcode_from, dest) * 0.621371`` by less than
+    0.001 mile (float32 rounds each coordinate by up to about 2 m).
+    """
+    if postal_index is None:
+        postal_index = load_postal_index()
+
+    codes, uniques = factorize_zips(zipcodes_to)
+    if len(uniques) == 0:
+        return np.empty(0, dtype=float)
+
+    origin = lookup_coords(postal_index, [zipcode_from])
+    dest = lookup_coords(postal_index, uniques)
+    origin = np.repeat(origin, dest.shape[0], axis=0)
+
+    unique_miles = haversine_km(origin, dest) * KM_TO_MILES
+    return unique_miles[codes]
+
+
+def factorize_pairs(zipcodes_from, zipcodes_to):
+    """``(codes, origins, dests)`` for per-row (origin, destination) ZIP pairs.
+
+    ``origins[i]`` / ``dests[i]`` is the i-th unique pair and ``codes`` maps each row to it.
+    """
+    o_codes, o_uniques = factorize_zips(zipcodes_from)
+    d_codes, d_uniques = factorize_zips(zipcodes_to)
+    width = max(len(d_uniques), 1)
+    unique_pairs, codes = np.unique(o_codes.astype(np.int64) * width + d_codes, return_inverse=True)
+    origins = np.asarray(o_uniques, dtype=object)[unique_pairs // width]
+    dests = np.asarray(d_uniques, dtype=object)[unique_pairs % width]
+    return codes.reshape(-1), origins, dests
+
+
+def pair_distance_miles(zipcodes_from, zipcodes_to, postal_index=None):
+    """Great-circle miles for per-row (origin, destination) ZIP pairs.
+
+    Every origin and destination is geocoded once and all unique pairs go through
+    one NumPy haversine pass; with a single origin this matches ``distance_miles``.
+    """
+    if postal_index is None:
+        postal_index = load_postal_index()
+
+    codes, origins, dests = factorize_pairs(zipcodes_from, zipcodes_to)
+    if len(origins) == 0:
+        return np.empty(0, dtype=float)
+
+    o_codes, o_uniques = pd.factorize(origins)
+    d_codes, d_uniques = pd.factorize(dests)
+    origin = lookup_coords(postal_index, o_uniques)[o_codes]
+    dest = lookup_coords(postal_index, d_uniques)[d_codes]
+
+    unique_miles = haversine_km(origin, dest) * KM_TO_MILES
+    return unique_miles[codes]
+
+
+def distance_category(miles):
+    """Bin distances into zones 1-8.
+
+    Missing distances (foreign or unknown ZIPs) are treated as zone 8.
+    """
+    miles = np.asarray(miles, dtype=float)
+    conditions = [miles <= ZONE_MILE_LIMITS[0]]
+    for lo, hi in zip(ZONE_MILE_LIMITS[:-1], ZONE_MILE_LIMITS[1:]):
+        conditions.append((miles > lo) & (miles <= hi))
+    conditions.append(miles > ZONE_MILE_LIMITS[-1])
+    choices = list(range(1, 9))
+    return np.select(conditions, choices, default=8).astype(int)
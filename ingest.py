@@ -0,0 +1,193 @@
+"""Chunked analysis with the stages overlapped on threads.
+
+    parse -> lookup -> match -> aggregate
+
+The CSV is read ``chunksize`` rows at a time like ``analyze_streaming``, but
+each stage runs on its own thread(s) and hands chunks to the next one through
+a bounded queue: while one chunk is being geocoded, the next is already being
+parsed and the previous one priced. pandas' CSV parser and most NumPy work
+release the GIL, so the stages really do overlap. At most ``queue_size`` chunks
+wait between two stages, so memory stays flat.
+
+Chunks are numbered as they are parsed and folded into the running aggregates
+on the calling thread strictly in that order, so the results (float sums and
+the cumulative series included) are the same as ``analyze_streaming``'s even
+with several lookup/match workers.
+"""
+import os
+import queue
+import threading
+
+import pandas as pd
+
+from rates import DEFAULT_SERVICE
+from waste_engine import (
+    DEFAULT_CHUNKSIZE,
+    RunningAggregates,
+    _compact_zips,
+    _csv_options,
+    distance_columns,
+    packaging_column,
+    prepare_orders,
+    validate_inputs,
+    weight_columns,
+)
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 2
+_DONE = object()  # end-of-input marker passed down the stages
+_POLL_SECONDS = 0.1
+
+
+def _source_size(source):
+    """Size in bytes of a CSV path or seekable buffer, None if unknown."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    try:
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+class _Stages:
+    """Threads joined by bounded queues; the first error stops all of them."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.stopped = threading.Event()
+        self.errors = []
+        self.threads = []
+
+    def queue(self):
+        return queue.Queue(self.queue_size)
+
+    def put(self, box, item):
+        """Blocking put that gives up once the stages are stopped; False if it gave up."""
+        while not self.stopped.is_set():
+            try:
+                box.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, box):
+        """Blocking get that returns ``_DONE`` once the stages are stopped."""
+        while not self.stopped.is_set():
+            try:
+                return box.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def start(self, name, target, *args):
+        def guarded():
+            try:
+                target(*args)
+            except BaseException as error:
+                self.errors.append(error)
+                self.stopped.set()
+
+        thread = threading.Thread(target=guarded, name=f"ingest-{name}", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def start_workers(self, name, func, inbox, outbox, workers):
+        """``workers`` threads applying ``func`` to each chunk; ``_DONE`` is passed on after the last."""
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                item = self.get(inbox)
+                if item is _DONE:
+                    self.put(inbox, _DONE)  # let sibling workers see it too
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        self.put(outbox, _DONE)
+                    return
+                seq, chunk, position = item
+                if not self.put(outbox, (seq, func(chunk), position)):
+                    return
+
+        for i in range(workers):
+            self.start(f"{name}-{i}", work)
+
+    def close(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def analyze_pipelined(source, zipcode_from, category, chunksize=DEFAULT_CHUNKSIZE,
+                      distance_cache=None, postal_index=None, on_chunk=None, compact=False,
+                      zone_matrix=None, sku_origins=None, service=DEFAULT_SERVICE,
+                      workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, on_progress=None):
+    """``analyze_streaming`` with parsing, destination lookup and rate matching overlapped.
+
+    ``workers`` threads run each of the lookup and match stages. ``on_chunk`` and
+    ``on_progress(rows_done, fraction)`` are called on the calling thread, in
+    chunk order; ``fraction`` is the share of the input read so far (None if
+    the size of ``source`` is unknown).
+    """
+    validate_inputs(zipcode_from, category)
+    total_bytes = _source_size(source)
+    stages = _Stages(queue_size)
+    parsed, located, matched = stages.queue(), stages.queue(), stages.queue()
+
+    def parse():
+        handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+        try:
+            for seq, chunk in enumerate(pd.read_csv(handle, chunksize=chunksize, **_csv_options(compact))):
+                if compact:
+                    chunk = _compact_zips(chunk)
+                position = handle.tell() if total_bytes else None
+                if not stages.put(parsed, (seq, prepare_orders(chunk), position)):
+                    return
+        finally:
+            if handle is not source:
+                handle.close()
+        stages.put(parsed, _DONE)
+
+    def lookup(chunk):
+        distances = distance_columns(chunk, zipcode_from, distance_cache, postal_index, zone_matrix, sku_origins)
+        return pd.concat([chunk, distances], axis=1)
+
+    def match(chunk):
+        weights = weight_columns(chunk, chunk['distance_cat'], service)
+        package = packaging_column(weights['matched_weight'], category)
+        return pd.concat([chunk, weights, package], axis=1)
+
+    running = RunningAggregates()
+    try:
+        stages.start("parse", parse)
+        stages.start_workers("lookup", lookup, parsed, located, workers)
+        stages.start_workers("match", match, located, matched, workers)
+
+        # aggregate stage: fold chunks in parse order, holding back any that finish early
+        pending, next_seq, rows = {}, 0, 0
+        while True:
+            item = stages.get(matched)
+            if item is _DONE:
+                break
+            seq, chunk, position = item
+            pending[seq] = (chunk, position)
+            while next_seq in pending:
+                chunk, position = pending.pop(next_seq)
+                next_seq += 1
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                running.update(chunk)
+                rows += len(chunk)
+                if on_progress is not None:
+                    on_progress(rows, min(position / total_bytes, 1.0) if position is not None else None)
+    finally:
+        stages.close()
+    if stages.errors:
+        raise stages.errors[0]
+    return running.result()
@@ -0,0 +1,84 @@
+"""Per-stage wall time, throughput and peak memory for the estimation pipeline.
+
+    timer = StageTimer()
+    with timer.stage("distance", rows=len(df_order)):
+        ...
+    timer.to_frame()   # one row per stage
+    timer.to_json()    # same records plus totals, for export
+    timer.log()        # one JSON line per stage on the "waste.perf" logger
+
+Peak memory comes from ``tracemalloc`` (NumPy and pandas report their buffers to
+it), which slows allocation-heavy code down, so it can be switched off with
+``trace_memory=False``.
+"""
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger("waste.perf")
+
+
+class StageTimer:
+    """Collects one record per timed stage: wall time, rows, rows/sec, peak memory."""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows=None, cached=False):
+        """Time the ``with`` body as stage ``name``.
+
+        The yielded record can be updated inside the block, e.g. ``record["rows"]``
+        once the row count is known.
+        """
+        record = {"stage": name, "rows": rows, "cached": cached}
+        tracing = self.trace_memory and not cached
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if tracing:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            if tracing:
+                record["peak_mb"] = (tracemalloc.get_traced_memory()[1] - base) / 1e6
+            if started_tracing:
+                tracemalloc.stop()
+            rows = record["rows"]
+            timed = rows and record["seconds"] > 0 and not cached
+            record["rows_per_sec"] = rows / record["seconds"] if timed else None
+            self.records.append(record)
+
+    def record_cached(self, name, rows=None):
+        """Note a stage whose result was reused, so it still shows up in reports."""
+        with self.stage(name, rows, cached=True):
+            pass
+
+    def add(self, name, seconds, rows=None):
+        """Add a stage that was timed elsewhere (no memory figure)."""
+        self.records.append({"stage": name, "rows": rows, "cached": False, "seconds": seconds,
+                             "rows_per_sec": rows / seconds if rows and seconds > 0 else None})
+
+    def to_frame(self):
+        columns = ["stage", "rows", "seconds", "rows_per_sec", "peak_mb", "cached"]
+        return pd.DataFrame(self.records).reindex(columns=columns)
+
+    def to_json(self, **meta):
+        return json.dumps({
+            **meta,
+            "total_seconds": sum(record["seconds"] for record in self.records),
+            "stages": self.records,
+        }, indent=2, default=str)
+
+    def log(self, **meta):
+        for record in self.records:
+            logger.info(json.dumps({**meta, **record}, default=str))
@@ -0,0 +1,147 @@
+"""Memoized, stage-by-stage version of ``waste_engine.analyze`` for interactive reruns.
+
+Stages and what their cache key covers:
+
+    parse      CSV content
+    distance   parse key + origin ZIP + SKU origins (+ whether zones come from the ZIP3 matrix)
+    weights    distance key (zones + shipping costs) + rate service
+    packaging  weights key + category
+    aggregates packaging key
+
+Keys chain the hashes of each stage's inputs, so switching the category only
+re-runs packaging and aggregates, and switching the origin skips CSV parsing.
+"""
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+from rates import DEFAULT_SERVICE
+from waste_engine import (
+    aggregate,
+    compact_orders,
+    distance_columns,
+    load_orders,
+    packaging_column,
+    prepare_orders,
+    validate_inputs,
+    weight_columns,
+)
+
+STAGES = ("parse", "distance", "weights", "packaging", "aggregates")
+
+
+def _hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def content_key(source):
+    """Hash of an orders source: DataFrame, bytes, file path or file-like object."""
+    if isinstance(source, pd.DataFrame):
+        return _hash(b"frame", pd.util.hash_pandas_object(source).to_numpy().tobytes(), tuple(source.columns))
+    if isinstance(source, bytes):
+        return _hash(source)
+    if isinstance(source, (str, os.PathLike)):
+        digest = hashlib.sha1()
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+        return _hash(digest.hexdigest().encode())
+    if hasattr(source, "getvalue"):
+        return _hash(source.getvalue())
+    raise TypeError(f"Can't hash orders source of type {type(source).__name__}")
+
+
+def _row_count(value):
+    # stage results are frames/series, or a tuple led by the enriched frame
+    return len(value[0]) if isinstance(value, tuple) else len(value)
+
+
+class StagedPipeline:
+    """Runs the estimation stages, reusing any stage whose inputs are unchanged.
+
+    Keeps the ``max_entries`` most recent results per stage. After each ``run``,
+    ``last_run`` maps every stage to ``"cached"`` or ``"computed"``. With
+    ``compact`` CSVs are loaded column-pruned and the returned frame uses compact
+    dtypes (see ``waste_engine.load_memory_report`` for what that saves).
+    Pass an ``instrumentation.StageTimer`` to ``run`` to time each stage. With a
+    ``zone_matrix`` zones come from ``zone_matrix.zone_lookup`` instead of geocoding.
+    """
+
+    def __init__(self, distance_cache=None, postal_index=None, max_entries=2, compact=False, zone_matrix=None):
+        self.distance_cache = distance_cache
+        self.postal_index = postal_index
+        self.zone_matrix = zone_matrix
+        self.max_entries = max_entries
+        self.compact = compact
+        self.last_run = {}
+        self._timer = None
+        self._memo = {stage: OrderedDict() for stage in STAGES}
+
+    def _stage(self, stage, key, compute):
+        memo = self._memo[stage]
+        if key in memo:
+            memo.move_to_end(key)
+            self.last_run[stage] = "cached"
+            if self._timer is not None:
+                self._timer.record_cached(stage, _row_count(memo[key]))
+            return memo[key]
+        if self._timer is None:
+            value = compute()
+        else:
+            with self._timer.stage(stage) as record:
+                value = compute()
+                record["rows"] = _row_count(value)
+        memo[key] = value
+        if len(memo) > self.max_entries:
+            memo.popitem(last=False)
+        self.last_run[stage] = "computed"
+        return value
+
+    def clear(self):
+        for memo in self._memo.values():
+            memo.clear()
+
+    def run(self, source, zipcode_from, category, timer=None, sku_origins=None, service=DEFAULT_SERVICE):
+        """Same result as ``waste_engine.analyze``: ``(enriched_orders, aggregates)``."""
+        validate_inputs(zipcode_from, category)
+        self.last_run = {}
+        self._timer = timer
+
+        parse_key = content_key(source)
+
+        def parse():
+            data = io.BytesIO(source) if isinstance(source, bytes) else source
+            if hasattr(data, "seek"):
+                data.seek(0)
+            raw = data if isinstance(data, pd.DataFrame) else load_orders(data, self.compact)
+            return prepare_orders(raw)
+
+        df_order = self._stage("parse", parse_key, parse)
+
+        distance_key = _hash(parse_key, zipcode_from, sorted((sku_origins or {}).items()), self.zone_matrix is not None)
+        distances = self._stage("distance", distance_key, lambda: distance_columns(
+            df_order, zipcode_from, self.distance_cache, self.postal_index, self.zone_matrix, sku_origins))
+
+        weights_key = _hash(distance_key, service)
+        weights = self._stage("weights", weights_key, lambda: weight_columns(
+            df_order, distances['distance_cat'], service))
+
+        packaging_key = _hash(weights_key, category)
+        package = self._stage("packaging", packaging_key, lambda: packaging_column(
+            weights['matched_weight'], category))
+
+        def build():
+            enriched = pd.concat([df_order, distances, weights, package], axis=1)
+            aggregates = aggregate(enriched)
+            return (compact_orders(enriched) if self.compact else enriched), aggregates
+
+        enriched, aggregates = self._stage("aggregates", packaging_key, build)
+        self._timer = None
+        return enriched, aggregates
@@ -0,0 +1,226 @@
+"""USPS rate tables and the weight-from-price inversion.
+
+Rate tables live in ``rate_tables/`` as one CSV per service and effective date,
+named ``<service>__<YYYY-MM-DD>.csv`` with a ``weight`` column (lb) and retail
+prices in ``Zone 1`` .. ``Zone 8``. They are compiled into a single ``.npz`` of
+float32 arrays, kept in the cache directory (``WASTE_CACHE_DIR``) so the source
+tree can be read-only, rebuilt whenever a CSV is newer and loaded once per process:
+
+    python rates.py build      # compile the CSVs
+    python rates.py list       # show the services and effective dates
+
+Each order is matched against the table of its service in effect on its Sale Date;
+orders older than the first table of a service use that first table.
+
+Several processes may find the store stale at once (batch workers, app
+sessions); the rebuild holds an exclusive lock on ``<store>.lock`` and writes
+to a temporary file of its own before moving it into place, so builders never
+clobber each other's output.
+"""
+import argparse
+import functools
+import glob
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from distance_cache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: the rebuild is only guarded within the process
+    fcntl = None
+
+RATE_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rate_tables")
+RATE_STORE_PATH = os.environ.get("WASTE_RATE_STORE", os.path.join(CACHE_DIR, "rates.npz"))
+DEFAULT_SERVICE = "usps_retail"
+
+
+def build_price_matrix(rate_table):
+    """Turn the rate table into a weight vector and a (zone x weight) price matrix.
+
+    ``prices[z - 1]`` holds the prices for zone ``z``, in the same order as ``weights``.
+    """
+    weights = np.asarray(rate_table["weight"], dtype=float)
+    prices = np.array([rate_table[f"Zone {z}"] for z in range(1, 9)], dtype=float)
+    # nearest-price search below relies on every zone's prices rising with weight
+    if not (np.diff(prices, axis=1) > 0).all():
+        raise ValueError("Rate table prices must strictly increase with weight in every zone")
+    return weights, prices
+
+
+def match_weights(distance_cat, shipping_cost, weights, prices):
+    """Invert the rate table: the weight whose zone price is closest to each shipping cost.
+
+    Works on whole columns at once, one sorted search per zone. Ties go to the
+    lighter weight, like ``idxmin`` on the absolute price difference. Orders with
+    no shipping cost get NaN.
+    """
+    zone_idx = np.asarray(distance_cat, dtype=np.intp) - 1
+    cost = np.asarray(shipping_cost, dtype=float)
+    best = np.zeros(cost.shape[0], dtype=np.intp)
+
+    last = prices.shape[1] - 1
+    for z in np.unique(zone_idx):
+        rows = zone_idx == z
+        zone_prices = prices[z]
+        zone_cost = cost[rows]
+        # first price >= cost, and the one just below it
+        hi = np.searchsorted(zone_prices, zone_cost, side="left").clip(1, last)
+        lo = hi - 1
+        take_lo = np.abs(zone_prices[lo] - zone_cost) <= np.abs(zone_prices[hi] - zone_cost)
+        best[rows] = np.where(take_lo, lo, hi)
+
+    matched = weights[best]
+    matched[np.isnan(cost)] = np.nan
+    return matched
+
+
+class RateStore:
+    """Rate table versions: ``(service, effective date) -> (weights, prices)``."""
+
+    def __init__(self, versions):
+        # {service: [(effective, weights, prices), ...]} sorted by effective date
+        self.versions = {}
+        for (service, effective), (weights, prices) in sorted(versions.items()):
+            self.versions.setdefault(service, []).append((np.datetime64(effective, "D"), weights, prices))
+
+    @property
+    def services(self):
+        return list(self.versions)
+
+    def effective_dates(self, service):
+        return [str(effective) for effective, _, _ in self._service(service)]
+
+    def _service(self, service):
+        if service not in self.versions:
+            raise ValueError(f"Unknown rate service {service!r}, have: {', '.join(self.versions)}")
+        return self.versions[service]
+
+    def table(self, service=DEFAULT_SERVICE, date=None):
+        """``(weights, prices)`` of ``service`` in effect on ``date`` (default: the latest)."""
+        versions = self._service(service)
+        if date is None:
+            return versions[-1][1:]
+        idx = np.searchsorted([effective for effective, _, _ in versions], np.datetime64(date, "D"), side="right")
+        return versions[max(idx - 1, 0)][1:]
+
+    def version_index(self, sale_dates, service=DEFAULT_SERVICE):
+        """Position in ``versions[service]`` of the table in effect on each sale date."""
+        effective = np.array([effective for effective, _, _ in self._service(service)])
+        days = np.asarray(sale_dates, dtype="datetime64[D]")
+        return (np.searchsorted(effective, days, side="right") - 1).clip(0)
+
+    def match_weights(self, distance_cat, shipping_cost, sale_dates, service=DEFAULT_SERVICE):
+        """``match_weights`` with each order priced by the table in effect on its sale date."""
+        versions = self._service(service)
+        cost = np.asarray(shipping_cost, dtype=float)
+        if len(versions) == 1:
+            return match_weights(distance_cat, cost, *versions[0][1:])
+        zones = np.asarray(distance_cat)
+        version_idx = self.version_index(sale_dates, service)
+        matched = np.empty(cost.shape[0], dtype=float)
+        for idx in np.unique(version_idx):
+            rows = version_idx == idx
+            matched[rows] = match_weights(zones[rows], cost[rows], *versions[idx][1:])
+        return matched
+
+
+def _parse_table_name(path):
+    service, _, effective = os.path.splitext(os.path.basename(path))[0].rpartition("__")
+    if not service:
+        raise ValueError(f"Rate table file names must look like <service>__<YYYY-MM-DD>.csv, got {path}")
+    return service, str(np.datetime64(effective, "D"))
+
+
+def build_rate_store(table_dir=RATE_TABLE_DIR, path=RATE_STORE_PATH):
+    """Compile every rate table CSV in ``table_dir`` into one ``.npz`` of float32 arrays."""
+    arrays = {}
+    for i, csv in enumerate(sorted(glob.glob(os.path.join(table_dir, "*.csv")))):
+        service, effective = _parse_table_name(csv)
+        weights, prices = build_price_matrix(pd.read_csv(csv))
+        arrays[f"{i}_service"] = np.array(service)
+        arrays[f"{i}_effective"] = np.array(effective)
+        arrays[f"{i}_weights"] = weights.astype(np.float32)
+        arrays[f"{i}_prices"] = prices.astype(np.float32)
+    if not arrays:
+        raise ValueError(f"No rate table CSVs in {table_dir}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fh = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with fh:
+            np.savez(fh, **arrays)
+        os.replace(fh.name, path)
+    except BaseException:
+        os.remove(fh.name)
+        raise
+    return path
+
+
+def _store_is_stale(table_dir, path):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(csv) > built for csv in glob.glob(os.path.join(table_dir, "*.csv")))
+
+
+@contextmanager
+def _build_lock(path):
+    """Exclusive lock, across processes, for (re)building the store at ``path``."""
+    with open(path + ".lock", "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+_load_lock = threading.Lock()
+
+
+def load_rate_store(path=RATE_STORE_PATH, table_dir=RATE_TABLE_DIR):
+    """The compiled rate tables, (re)built from the CSVs if needed. Cached per process."""
+    with _load_lock:
+        return _rate_store(path, table_dir)
+
+
+@functools.lru_cache(maxsize=None)
+def _rate_store(path, table_dir):
+    if os.path.isdir(table_dir) and _store_is_stale(table_dir, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _build_lock(path):
+            if _store_is_stale(table_dir, path):  # another process may have just built it
+                build_rate_store(table_dir, path)
+    versions = {}
+    with np.load(path) as data:
+        for i in range(len(data.files) // 4):
+            key = (str(data[f"{i}_service"]), str(data[f"{i}_effective"]))
+            # stored as float32; round back to exact cents / weights so ties match the CSV values
+            weights = np.round(data[f"{i}_weights"].astype(float), 4)
+            prices = np.round(data[f"{i}_prices"].astype(float), 2)
+            versions[key] = (weights, prices)
+    return RateStore(versions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the compiled USPS rate tables.")
+    parser.add_argument("command", choices=["build", "list"])
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        print(build_rate_store(), file=sys.stderr)
+    store = load_rate_store()
+    for service in store.services:
+        print(f"{service}: {', '.join(store.effective_dates(service))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""On-disk stores for enriched order results (Parquet / Arrow, needs pyarrow).
+
+``AppendStore`` keeps the history for one (seller, origin ZIP, category, rate service): every upload only
+pushes orders that were not processed before through geocoding and rate matching,
+then folds them into the saved running aggregates.
+
+``save_analysis`` / ``load_analysis`` keep finished analyses as uncompressed Arrow
+IPC files, so a past analysis reopens memory-mapped without re-running anything.
+Analyses are saved per workspace (the app names it with a random token kept in
+the page URL, so a bookmarked page reopens them in a later session), so nobody
+lists or opens another visitor's orders, and each workspace has its own
+``MAX_SAVED_ANALYSES`` cap. Workspaces nobody saved to or opened from for
+``WORKSPACE_MAX_AGE_DAYS`` are removed.
+"""
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+from distance_cache import CACHE_DIR
+from rates import DEFAULT_SERVICE
+from waste_engine import (
+    ORDER_COLUMNS,
+    ORDER_ID_COLUMN,
+    ORIGIN_COLUMN,
+    SKU_COLUMN,
+    RunningAggregates,
+    compact_orders,
+    distance_columns,
+    load_orders,
+    packaging_column,
+    prepare_orders,
+    validate_inputs,
+    weight_columns,
+)
+
+APPEND_DIR = os.path.join(CACHE_DIR, "append")
+RESULTS_DIR = os.path.join(CACHE_DIR, "analyses")
+MAX_SAVED_ANALYSES = 20
+WORKSPACE_MAX_AGE_DAYS = 7
+
+# aggregate tables saved next to the orders of an analysis
+_AGGREGATE_TABLES = ("monthly", "state_sales", "origin_sales", "cumulative", "cube")
+# input columns that identify an order when the CSV has no Order ID
+_ROW_HASH_COLUMNS = (*ORDER_COLUMNS, ORIGIN_COLUMN, SKU_COLUMN)
+ROW_HASH_COLUMN = "row_hash"
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def row_hashes(df_order):
+    """uint64 hash per order of its input columns (date, destination, shipping, ...)."""
+    columns = [col for col in _ROW_HASH_COLUMNS if col in df_order]
+    values = pd.DataFrame({col: df_order[col].astype(object) for col in columns})
+    return pd.util.hash_pandas_object(values, index=False).rename(ROW_HASH_COLUMN)
+
+
+def _unseen(hashes, seen):
+    """Mask of the orders in ``hashes`` not covered by ``seen``, counting repeats.
+
+    Two identical rows are two orders: a hash seen once before lets only the first of
+    its new copies through as already processed.
+    """
+    occurrence = hashes.groupby(hashes).cumcount()
+    seen_counts = hashes.map(seen.value_counts()).fillna(0)
+    return (occurrence >= seen_counts).to_numpy()
+
+
+class AppendStore:
+    """Incrementally processed order history for one origin ZIP, category and rate service.
+
+    Layout of ``<root>/<name>/<origin>-<category>-<service>/`` (``name`` is the
+    seller's history name; without one the history sits directly in ``root``):
+
+        manifest.json           name, origin, category, service, totals, dedup mode, parts
+        orders-00001.parquet    enriched orders added by each append (compact dtypes)
+        cube.parquet            running waste cube (see waste_engine.waste_cube)
+
+    New orders are found by ``Order ID`` when the CSV has one; otherwise by a hash
+    of each row's input columns (see ``row_hashes``), so re-exports and late orders
+    on any date are handled alike.
+    """
+
+    def __init__(self, zipcode_from, category, service=DEFAULT_SERVICE, name=None, root=APPEND_DIR):
+        validate_inputs(zipcode_from, category)
+        self.zipcode_from = zipcode_from
+        self.category = category
+        self.service = service
+        self.name = name
+        key = f"{zipcode_from}-{_slug(category)}-{_slug(service)}"
+        if name is not None:
+            if not _slug(name):
+                raise ValueError(f"History names need at least one letter or digit, got {name!r}")
+            self.path = os.path.join(root, _slug(name), key)
+        else:
+            self.path = os.path.join(root, key)
+        self.manifest = self._read_manifest()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._file("manifest.json")) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {"name": self.name, "origin": self.zipcode_from, "category": self.category,
+                    "service": self.service, "order_count": 0,
+                    "total_waste": 0.0, "dedup": None, "parts": []}
+
+    def _write_manifest(self):
+        self.manifest["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(self.manifest, fh, indent=2)
+        os.replace(tmp, self._file("manifest.json"))
+
+    def _running(self):
+        if not self.manifest["parts"]:
+            return RunningAggregates()
+        frames = {"cube": pd.read_parquet(self._file("cube.parquet"))}
+        return RunningAggregates.from_frames(frames, self.manifest["total_waste"], self.manifest["order_count"])
+
+    def _seen(self, column):
+        parts = [self._file(part) for part in self.manifest["parts"]]
+        if not parts:
+            return pd.Series(dtype=object)
+        return pd.concat([pd.read_parquet(part, columns=[column])[column] for part in parts])
+
+    def _new_orders(self, df_order):
+        dedup = self.manifest["dedup"]
+        if dedup is None:
+            dedup = "order_id" if ORDER_ID_COLUMN in df_order else "row_hash"
+        if dedup == "order_id":
+            if ORDER_ID_COLUMN not in df_order:
+                raise ValueError(f"This history is deduplicated by '{ORDER_ID_COLUMN}', which the CSV lacks")
+            new = df_order[~df_order[ORDER_ID_COLUMN].isin(self._seen(ORDER_ID_COLUMN))]
+        else:
+            new = df_order[_unseen(row_hashes(df_order), self._seen(ROW_HASH_COLUMN))]
+        return new, dedup
+
+    def append(self, source, distance_cache=None, postal_index=None, sku_origins=None):
+        """Process only the unseen orders in ``source``; returns ``(new_order_count, aggregates)``."""
+        df_order = prepare_orders(load_orders(source, compact=True, extra_columns=[ORDER_ID_COLUMN]))
+        new, dedup = self._new_orders(df_order)
+        running = self._running()
+        if new.empty:
+            return 0, running.result()
+
+        distances = distance_columns(new, self.zipcode_from, distance_cache, postal_index, sku_origins=sku_origins)
+        weights = weight_columns(new, distances['distance_cat'], self.service)
+        package = packaging_column(weights['matched_weight'], self.category)
+        enriched = pd.concat([new, distances, weights, package], axis=1)
+        running.update(enriched)
+
+        os.makedirs(self.path, exist_ok=True)
+        part = f"orders-{len(self.manifest['parts']) + 1:05d}.parquet"
+        stored = compact_orders(enriched)
+        if dedup == "row_hash":
+            stored[ROW_HASH_COLUMN] = row_hashes(new)
+        stored.to_parquet(self._file(part), index=False)
+        for name, frame in running.to_frames().items():
+            frame.to_parquet(self._file(f"{name}.parquet"), index=False)
+
+        self.manifest.update({
+            "order_count": running.order_count,
+            "total_waste": running.total_waste,
+            "dedup": dedup,
+            "parts": self.manifest["parts"] + [part],
+        })
+        self._write_manifest()
+        return len(enriched), running.result()
+
+    def aggregates(self):
+        return self._running().result()
+
+    def load_orders(self):
+        """All stored enriched orders, oldest append first."""
+        parts = self.manifest["parts"]
+        if not parts:
+            return pd.DataFrame()
+        orders = pd.concat([pd.read_parquet(self._file(part)) for part in parts], ignore_index=True)
+        return orders.drop(columns=[ROW_HASH_COLUMN], errors="ignore")
+
+
+def _write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_arrow(path):
+    """Memory-map an Arrow IPC file; the returned table references the mapped pages."""
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def is_valid_workspace(workspace):
+    return bool(re.fullmatch(r"[A-Za-z0-9_-]+", workspace or ""))
+
+
+def _workspace_dir(workspace, root):
+    if not is_valid_workspace(workspace):
+        raise ValueError(f"Workspace names may only use letters, digits, '-' and '_', got {workspace!r}")
+    return os.path.join(root, workspace)
+
+
+def _prune_workspaces(root, max_age_days=WORKSPACE_MAX_AGE_DAYS):
+    cutoff = time.time() - max_age_days * 86400
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            continue  # pruned by another session
+
+
+def save_analysis(df_order, aggregates, meta, workspace, root=RESULTS_DIR, max_saved=MAX_SAVED_ANALYSES):
+    """Save one analysis (enriched orders may be None) in ``workspace`` and return its id.
+
+    ``meta`` is stored as-is next to the tables, e.g. origin, category and file name.
+    Only the workspace's ``max_saved`` most recent analyses are kept.
+    """
+    analysis_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    path = os.path.join(_workspace_dir(workspace, root), analysis_id)
+    os.makedirs(path)  # also refreshes the workspace's mtime, which pruning goes by
+    if df_order is not None:
+        _write_arrow(df_order, os.path.join(path, "orders.arrow"))
+    for name in _AGGREGATE_TABLES:
+        _write_arrow(aggregates[name], os.path.join(path, f"{name}.arrow"))
+    meta = {**meta, "id": analysis_id, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "total_waste": aggregates["total_waste"], "order_count": aggregates["order_count"],
+            "has_orders": df_order is not None}
+    with open(os.path.join(path, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+
+    for old in list_analyses(workspace, root)[max_saved:]:
+        shutil.rmtree(os.path.join(root, workspace, old["id"]), ignore_errors=True)
+    _prune_workspaces(root)
+    return analysis_id
+
+
+def list_analyses(workspace, root=RESULTS_DIR):
+    """Metadata of the analyses saved in ``workspace``, newest first."""
+    metas = []
+    path = _workspace_dir(workspace, root)
+    if os.path.isdir(path):
+        for analysis_id in os.listdir(path):
+            try:
+                with open(os.path.join(path, analysis_id, "meta.json")) as fh:
+                    metas.append(json.load(fh))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue  # half-written or foreign directory
+    return sorted(metas, key=lambda meta: meta["id"], reverse=True)
+
+
+def load_analysis(analysis_id, workspace, root=RESULTS_DIR):
+    """Reopen a saved analysis: ``(orders_table, aggregates, meta)``.
+
+    ``orders_table`` is a memory-mapped ``pyarrow.Table`` (None if the orders were
+    not saved); call ``.to_pandas()`` only if per-order rows are needed. The small
+    aggregate tables are returned as DataFrames, ready for the dashboard.
+    """
+    path = os.path.join(_workspace_dir(workspace, root), analysis_id)
+    with open(os.path.join(path, "meta.json")) as fh:
+        meta = json.load(fh)
+    os.utime(os.path.dirname(path))  # an opened workspace is still in use; see _prune_workspaces
+    aggregates = {name: _read_arrow(os.path.join(path, f"{name}.arrow")).to_pandas() for name in _AGGREGATE_TABLES}
+    aggregates["total_waste"] = meta["total_waste"]
+    aggregates["order_count"] = meta["order_count"]
+    orders_path = os.path.join(path, "orders.arrow")
+    orders_table = _read_arrow(orders_path) if os.path.exists(orders_path) else None
+    return orders_table, aggregates, meta
@@ -0,0 +1,69 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Caches and the default centroid store go to a scratch directory, never the working tree;
+# set before the modules read them at import
+_SCRATCH = tempfile.mkdtemp(prefix="waste-tests-")
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+os.environ["WASTE_CACHE_DIR"] = os.path.join(_SCRATCH, "cache")
+os.environ["WASTE_CENTROID_STORE"] = os.path.join(_SCRATCH, "zip_centroids_us.npy")
+
+from centroids import CENTROID_DTYPE, CentroidStore, save_centroids  # noqa: E402
+
+# A handful of real ZIP centroids, enough to give orders several zones
+ZIPS = [
+    ("02108", 42.3576, -71.0636, "MA"),
+    ("10001", 40.7506, -73.9972, "NY"),
+    ("33101", 25.7791, -80.1978, "FL"),
+    ("60601", 41.8858, -87.6181, "IL"),
+    ("80202", 39.7525, -104.9995, "CO"),
+    ("90001", 33.9731, -118.2479, "CA"),
+    ("98101", 47.6114, -122.3305, "WA"),
+]
+
+
+def zip_records(zips=ZIPS):
+    return np.array([(int(z), lat, lon, state.encode()) for z, lat, lon, state in zips], dtype=CENTROID_DTYPE)
+
+
+# the default store (used by code that loads it itself: the app, API server and batch workers)
+save_centroids(zip_records(), os.environ["WASTE_CENTROID_STORE"])
+
+
+@pytest.fixture
+def postal_index():
+    return CentroidStore(zip_records())
+
+
+def make_orders(n=60, seed=0):
+    """A Sold Orders frame over the fixture ZIPs, three months of sales."""
+    rng = np.random.default_rng(seed)
+    zips = [ZIPS[i] for i in rng.integers(0, len(ZIPS), n)]
+    orders = pd.DataFrame({
+        'Sale Date': pd.date_range('2024-01-01', '2024-03-31', periods=n).strftime('%m/%d/%y'),
+        'Order ID': np.arange(1_000_000, 1_000_000 + n),
+        'Ship Zipcode': [z for z, _, _, _ in zips],
+        'Order Shipping': rng.choice([0.0, 5.4, 8.15, 12.3, 19.9, 31.5], n),
+        'Ship State': [state for _, _, _, state in zips],
+        'Ship Country': 'United States',
+        'Order Value': rng.uniform(10, 200, n).round(2),
+    })
+    orders.loc[n - 1, ['Ship Country', 'Ship State']] = ['Canada', None]
+    return orders
+
+
+@pytest.fixture
+def orders_csv(tmp_path):
+    path = tmp_path / "orders.csv"
+    make_orders().to_csv(path, index=False)
+    return str(path)
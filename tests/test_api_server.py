@@ -0,0 +1,85 @@
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from api_server import make_server
+from conftest import make_orders
+from waste_engine import analyze
+
+
+@pytest.fixture
+def server():
+    server = make_server(port=0, workers=1, queue_size=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.waste_service.shutdown()
+
+
+def _request(server, head, body=b""):
+    with socket.create_connection(("127.0.0.1", server.server_port), timeout=5) as sock:
+        sock.sendall(head.encode() + b"\r\n" + body)
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+    status = int(response.split(b" ", 2)[1])
+    return status, json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+def test_full_pool_rejects_before_reading_the_body(server):
+    assert server.waste_service.reserve()  # the only slot is busy
+    # Announce a 100 MB upload but send a few bytes: the 503 must not wait for the rest
+    status, payload = _request(server, "POST /analyze?origin=10001&category=Clothing HTTP/1.1\r\n"
+                                       "Host: localhost\r\nContent-Length: 100000000\r\n", b"Sale Date,")
+    assert status == 503 and "busy" in payload["error"]
+    assert server.waste_service.metrics.rejected == 1
+    server.waste_service.release()
+    assert server.waste_service.in_flight == 0
+
+
+def test_missing_parameters_and_health(server):
+    status, payload = _request(server, "POST /analyze?origin=10001 HTTP/1.1\r\nHost: localhost\r\n"
+                                       "Content-Length: 3\r\nConnection: close\r\n", b"a,b")
+    assert status == 400 and "category" in payload["error"]
+    status, payload = _request(server, "GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n")
+    assert status == 200 and payload == {'status': 'ok'}
+
+
+def _post(server, path, body):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    conn.request("POST", path, body, {"Content-Type": "text/csv"})
+    response = conn.getresponse()
+    payload = json.loads(response.read())
+    conn.close()
+    return response.status, payload
+
+
+def _get(server, path):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+    conn.request("GET", path)
+    payload = json.loads(conn.getresponse().read())
+    conn.close()
+    return payload
+
+
+@pytest.mark.parametrize("query", ["", "&chunksize=7"])
+def test_analyze_returns_the_aggregates_and_counts_them(server, postal_index, query):
+    orders = make_orders()
+    status, payload = _post(server, f"/analyze?origin=10001&category=Clothing{query}",
+                            orders.to_csv(index=False).encode())
+    assert status == 200
+    _, expected = analyze(orders, '10001', 'Clothing', postal_index=postal_index)
+    assert payload['order_count'] == 60
+    assert payload['total_waste'] == pytest.approx(expected['total_waste'], abs=1e-3)
+    assert [row['month'] for row in payload['monthly']] == ['2024-01', '2024-02', '2024-03']
+    assert {row['state'] for row in payload['state_sales']} == set(expected['state_sales']['Ship State'])
+    assert payload['origin_sales'] == [{'origin': '10001', 'package_weight': payload['total_waste'], 'orders': 60}]
+
+    metrics = _get(server, "/metrics")
+    assert metrics['requests'] == {'200': 1} and metrics['orders_processed'] == 60
+    assert metrics['in_flight'] == 0 and metrics['latency_seconds']['window'] == 1
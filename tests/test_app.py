@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import geo
+from conftest import make_orders
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "WasteEstimationModel.py")
+
+
+def _session(workspace=None):
+    at = AppTest.from_file(APP, default_timeout=60)
+    if workspace is not None:
+        at.query_params["workspace"] = workspace
+    return at.run()
+
+
+def _run_analysis(at, orders):
+    at.file_uploader[0].set_value(("orders.csv", orders.to_csv(index=False).encode(), "text/csv"))
+    at.text_input[0].input("10001")
+    at.selectbox[0].select("Clothing")
+    at.run()
+    next(b for b in at.button if "Run analysis" in b.label).click()
+    return at.run()
+
+
+def test_a_later_session_reopens_analyses_from_its_workspace_token():
+    first = _run_analysis(_session(), make_orders())
+    assert not first.exception and not first.error
+    workspace = first.query_params["workspace"]
+    total = first.session_state.total_waste
+
+    later = _session(workspace)
+    next(b for b in later.button if b.label == "Open saved analysis").click()
+    later.run()
+    assert later.session_state.analysis_ready and later.session_state.total_waste == pytest.approx(total)
+
+    stranger = _session()
+    assert stranger.query_params["workspace"] != workspace
+    assert not [b for b in stranger.button if b.label == "Open saved analysis"]
+
+
+def test_a_missing_centroid_store_is_reported(monkeypatch):
+    def missing():
+        raise FileNotFoundError("No ZIP centroid store")
+
+    monkeypatch.setattr(geo, "load_postal_index", missing)
+    at = _run_analysis(_session(), make_orders())
+    assert not at.exception
+    assert [e.value for e in at.error] == ["No ZIP centroid store"]
+    assert not at.session_state.analysis_ready
+
+
+def test_a_bad_sku_mapping_is_reported():
+    at = _session()
+    at.file_uploader[1].set_value(("skus.csv", b"sku,warehouse\nA,10001\n", "text/csv"))
+    at = _run_analysis(at, make_orders())
+    assert not at.exception and [e.value for e in at.error] == ["skus.csv is missing columns: SKU, origin_zip"]
@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+import pytest
+
+from batch import load_jobs, run_batch
+from conftest import make_orders
+from waste_engine import analyze
+
+
+def test_batch_runs_every_seller_on_the_pool(tmp_path, orders_csv, postal_index):
+    other = tmp_path / "other.csv"
+    make_orders(seed=1).to_csv(other, index=False)
+    jobs_csv = tmp_path / "jobs.csv"
+    pd.DataFrame({
+        "seller": ["shop-a", "shop-b", "shop-c"],
+        "orders_csv": [orders_csv, str(other), str(tmp_path / "missing.csv")],
+        "origin_zip": ["10001", "02108", "10001"],
+        "category": ["Clothing", "Art & Prints", "Clothing"],
+    }).to_csv(jobs_csv, index=False)
+
+    out = tmp_path / "out"
+    summary = run_batch(load_jobs(str(jobs_csv)), str(out), workers=2, use_cache=False)
+    assert summary["seller"].tolist() == ["shop-a", "shop-b", "shop-c"]
+    assert summary["orders"].tolist() == [60, 60, 0]
+    assert summary["error"].iloc[:2].tolist() == ["", ""] and "FileNotFoundError" in summary["error"].iloc[2]
+
+    _, expected = analyze(str(other), "02108", "Art & Prints", postal_index=postal_index)
+    assert summary["total_waste_lbs"].iloc[1] == pytest.approx(expected["total_waste"], abs=0.01)
+    for name in ("summary.csv", "shop-a_orders.csv", "shop-b_monthly.csv", "shop-b_states.csv"):
+        assert os.path.exists(out / name)
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from centroids import load_centroids, save_centroids
+
+
+def test_missing_store_is_not_built(tmp_path, monkeypatch):
+    monkeypatch.setattr("centroids.build_centroids", lambda *args: pytest.fail("tried to build the store"))
+    with pytest.raises(FileNotFoundError, match="python centroids.py build"):
+        load_centroids(str(tmp_path / "missing.npy"))
+
+
+def test_saved_store_round_trips(tmp_path, postal_index):
+    path = str(tmp_path / "centroids.npy")
+    save_centroids(postal_index.records, path)
+    store = load_centroids(path)
+    coords = store.coords(["10001", "99999", "abc"])
+    assert np.allclose(coords[0], postal_index.coords(["10001"])[0])
+    assert np.isnan(coords[1:]).all()
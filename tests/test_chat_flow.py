@@ -0,0 +1,55 @@
+import ast
+import os
+
+import pytest
+
+from chat_flow import ChatHistory, compile_flow
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def flow_of(script):
+    """The FLOW dict literal of an app script, read without running Streamlit."""
+    with open(os.path.join(ROOT, script), encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "FLOW":
+            return ast.literal_eval(node.value)
+    raise AssertionError(f"no FLOW in {script}")
+
+
+@pytest.mark.parametrize("script", ["chatbot.py", "WasteEstimationModel.py"])
+def test_app_flows_compile(script):
+    flow = compile_flow(flow_of(script))
+    assert flow["start"].options
+
+
+def test_broken_flows_are_rejected():
+    flow = {
+        "start": {"text": "Hi", "options": [{"label": "Go", "next": "missing"}]},
+        "tuple_text": {"text": ("a", "b"), "options": []},
+    }
+    with pytest.raises(ValueError) as excinfo:
+        compile_flow(flow)
+    assert "missing node 'missing'" in str(excinfo.value)
+    assert "tuple_text: text must be a string" in str(excinfo.value)
+    with pytest.raises(ValueError, match="no 'start' node"):
+        compile_flow({"other": {"text": "x"}})
+
+
+def test_history_is_bounded_and_spills_to_disk(tmp_path):
+    history = ChatHistory(max_messages=3, spill_dir=str(tmp_path))
+    for i in range(7):
+        history.append("user", f"m{i}")
+    assert len(history) == 7
+    assert [m["content"] for m in history.recent(12)] == ["m4", "m5", "m6"]
+    assert history.transcript().splitlines() == [f"user: m{i}" for i in range(7)]
+    history.clear()
+    assert history.transcript() == "" and os.listdir(tmp_path) == []
+
+
+def test_history_without_spill_keeps_only_recent_messages():
+    history = ChatHistory(max_messages=2)
+    for i in range(4):
+        history.append("assistant", f"m{i}")
+    assert history.transcript() == "assistant: m2\nassistant: m3"
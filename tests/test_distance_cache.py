@@ -0,0 +1,46 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import distance_cache
+from centroids import CentroidStore
+from conftest import ZIPS, zip_records
+from distance_cache import DistanceCache, cached_distances
+from geo import distance_miles
+
+
+def test_hits_and_misses_count_unique_pairs(tmp_path, postal_index):
+    cache = DistanceCache(str(tmp_path / "d.sqlite"))
+    dests = pd.Series(["90001", "98101", "90001", "99999"])
+    miles, cats = cached_distances("10001", dests, cache, postal_index)
+    assert cache.stats() == {"entries": 3, "hits": 0, "misses": 3}
+    again, _ = cached_distances("10001", dests, cache, postal_index)
+    assert cache.stats() == {"entries": 3, "hits": 3, "misses": 3}
+    np.testing.assert_array_equal(again, miles)
+    np.testing.assert_array_equal(again, distance_miles("10001", dests, postal_index))
+
+
+def test_least_recently_used_pairs_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(distance_cache.time, "time", lambda: next(clock))
+    cache = DistanceCache(str(tmp_path / "d.sqlite"), max_entries=3)
+    cache.use_source("test")
+    for dest in ["a", "b", "c"]:
+        cache.put_many("10001", [dest], [1.0], [1])
+    cache.get_many("10001", ["a"])  # "b" is now the least recently used
+    cache.put_many("10001", ["d"], [1.0], [1])
+    assert len(cache) == 3
+    assert set(cache.get_many("10001", ["a", "b", "c", "d"])) == {"a", "c", "d"}
+
+
+def test_a_rebuilt_store_is_not_served_stale_distances(tmp_path, postal_index):
+    cache = DistanceCache(str(tmp_path / "d.sqlite"))
+    cached_distances("10001", ["90001", None], cache, postal_index)
+    moved = [(z, lat + 1, lon, state) if z == "90001" else (z, lat, lon, state) for z, lat, lon, state in ZIPS]
+    rebuilt = CentroidStore(zip_records(moved))
+    assert rebuilt.version != postal_index.version
+
+    miles, _ = cached_distances("10001", ["90001"], DistanceCache(str(tmp_path / "d.sqlite")), rebuilt)
+    np.testing.assert_array_equal(miles, distance_miles("10001", ["90001"], rebuilt))
+    assert len(cache) == 1  # the old store's pair is gone
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsample import downsample_cumulative, lttb_indices
+
+
+def _cumulative(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Sale Date': pd.date_range('2020-01-01', periods=n, freq='D'),
+                         'Cumulative Waste': rng.exponential(1.0, n).cumsum()})
+
+
+@pytest.mark.parametrize('n, budget', [(10_000, 2000), (5000, 3), (2001, 2000), (997, 10)])
+def test_lttb_keeps_the_endpoints_within_the_budget(n, budget):
+    cumulative = _cumulative(n)
+    small = downsample_cumulative(cumulative, budget)
+    assert len(small) == budget
+    assert small.iloc[0].equals(cumulative.iloc[0]) and small.iloc[-1].equals(cumulative.iloc[-1])
+    assert small['Sale Date'].is_monotonic_increasing
+
+
+def test_short_series_are_left_alone():
+    cumulative = _cumulative(50)
+    assert downsample_cumulative(cumulative, 50) is cumulative
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(1000)
+    y[437] = 100.0
+    assert 437 in lttb_indices(np.arange(1000), y, 20)
+    with pytest.raises(ValueError):
+        lttb_indices(np.arange(10), np.arange(10), 2)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from forecast import fit_models, forecast, monthly_history, waste_forecast
+
+
+def make_cube(dates, weight=1.0):
+    return pd.DataFrame({
+        'Sale Date': pd.to_datetime(dates),
+        'package_weight': weight,
+        'Ship Country': 'United States',
+        'Ship State': 'CA',
+    })
+
+
+def test_no_complete_month_has_no_forecast():
+    cube = make_cube(['2024-03-01', '2024-03-15'])  # March is not over
+    assert len(monthly_history(cube)) == 0
+    assert waste_forecast(cube, 6) is None
+
+
+def test_one_complete_month_has_no_forecast():
+    cube = make_cube(['2024-01-01', '2024-01-31'])
+    assert len(monthly_history(cube)) == 1
+    assert waste_forecast(cube, 6) is None
+
+
+def test_empty_cube_has_no_forecast():
+    assert waste_forecast(make_cube([]), 6) is None
+
+
+def test_fit_models_without_months_or_series():
+    assert fit_models(np.zeros((1, 0))).shape == (1, 2)
+    assert fit_models(np.zeros((0, 5))).shape == (0, 2)
+
+
+def test_two_months_forecast():
+    cube = make_cube(['2024-01-10', '2024-02-10', '2024-03-02'])  # March is partial
+    projection = waste_forecast(cube, 3)
+    assert len(projection['monthly']) == 3
+    assert list(projection['state_sales']['Ship State']) == ['CA']
+    assert (projection['monthly']['package_weight'] >= 0).all()
+
+
+def test_forecast_continues_a_linear_trend():
+    history = pd.DataFrame({'total': np.arange(1.0, 13.0)},
+                           index=pd.period_range('2023-01', periods=12, freq='M'))
+    projected = forecast(history, 2)
+    assert list(projected.index.astype(str)) == ['2024-01', '2024-02']
+    assert projected['total'].iloc[0] > 12
@@ -0,0 +1,54 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from conftest import ZIPS
+from geo import ZONE_MILE_LIMITS, distance_category, distance_miles, pair_distance_miles
+
+COORDS = {z: (lat, lon) for z, lat, lon, _ in ZIPS}
+
+
+def scalar_miles(zip_from, zip_to):
+    """Per-row haversine with pgeocode's earth radius, as ``GeoDistance.query_postal_code`` did."""
+    if zip_from not in COORDS or zip_to not in COORDS:
+        return math.nan
+    (lat1, lon1), (lat2, lon2) = (map(math.radians, COORDS[z]) for z in (zip_from, zip_to))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.009 * 2 * math.asin(math.sqrt(a)) * 0.621371
+
+
+def test_distance_miles_matches_a_per_row_loop(postal_index):
+    rng = np.random.default_rng(1)
+    dests = [ZIPS[i][0] for i in rng.integers(0, len(ZIPS), 40)] + ["99999", "02108"]
+    miles = distance_miles("10001", pd.Series(dests), postal_index)
+    expected = [scalar_miles("10001", d) for d in dests]
+    np.testing.assert_allclose(miles, expected, rtol=0, atol=1e-3)
+    assert np.isnan(miles[-2])
+
+
+def test_pair_distances_match_a_per_row_loop(postal_index):
+    rng = np.random.default_rng(2)
+    origins = [ZIPS[i][0] for i in rng.integers(0, len(ZIPS), 30)]
+    dests = [ZIPS[i][0] for i in rng.integers(0, len(ZIPS), 30)]
+    miles = pair_distance_miles(pd.Series(origins), pd.Series(dests), postal_index)
+    expected = [scalar_miles(o, d) for o, d in zip(origins, dests)]
+    np.testing.assert_allclose(miles, expected, rtol=0, atol=1e-3)
+    single = pair_distance_miles(pd.Series(["10001"] * 30), pd.Series(dests), postal_index)
+    np.testing.assert_array_equal(single, distance_miles("10001", pd.Series(dests), postal_index))
+
+
+def test_distance_category_boundaries():
+    limits = np.array(ZONE_MILE_LIMITS, dtype=float)
+    assert distance_category(limits).tolist() == list(range(1, 8))
+    assert distance_category(limits + 0.01).tolist() == list(range(2, 9))
+    assert distance_category([0.0, np.nan]).tolist() == [1, 8]
+
+
+def test_missing_zips_get_no_distance(postal_index):
+    dests = pd.Series(["90001", None, "98101"])
+    miles = distance_miles("10001", dests, postal_index)
+    assert np.isnan(miles[1]) and not np.isnan(miles[[0, 2]]).any()
+    pair_miles = pair_distance_miles(pd.Series(["10001", None, "10001"]), dests, postal_index)
+    assert np.isnan(pair_miles[1]) and np.array_equal(pair_miles[[0, 2]], miles[[0, 2]])
+    assert distance_category(miles).tolist()[1] == 8
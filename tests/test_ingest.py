@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from ingest import analyze_pipelined
+from waste_engine import analyze, analyze_streaming
+
+
+def assert_same_aggregates(result, expected):
+    assert result['order_count'] == expected['order_count']
+    assert result['total_waste'] == pytest.approx(expected['total_waste'])
+    # compact whole-file loads keep states categorical, chunked loads can't
+    for key in ('monthly', 'state_sales', 'cumulative', 'cube'):
+        pd.testing.assert_frame_equal(result[key], expected[key], check_exact=False, check_dtype=False,
+                                      check_categorical=False)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_streamed_and_pipelined_runs_match_the_whole_file(orders_csv, postal_index, compact):
+    _, expected = analyze(orders_csv, '10001', 'Clothing', postal_index=postal_index, compact=compact)
+    streamed = analyze_streaming(orders_csv, '10001', 'Clothing', chunksize=7, postal_index=postal_index,
+                                 compact=compact)
+    assert_same_aggregates(streamed, expected)
+
+    seen = []
+    pipelined = analyze_pipelined(orders_csv, '10001', 'Clothing', chunksize=7, postal_index=postal_index,
+                                  compact=compact, workers=2, on_chunk=lambda chunk: seen.append(len(chunk)))
+    assert_same_aggregates(pipelined, expected)
+    assert seen == [7] * 8 + [4]
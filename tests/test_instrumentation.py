@@ -0,0 +1,39 @@
+import json
+import logging
+
+import numpy as np
+
+from instrumentation import StageTimer
+
+
+def _timer():
+    timer = StageTimer()
+    with timer.stage("parse") as record:
+        data = np.ones(1_000_000)
+        record["rows"] = len(data)
+    timer.record_cached("distance", rows=10)
+    timer.add("charts", 0.5, rows=100)
+    return timer
+
+
+def test_records_cover_time_rows_memory_and_reuse():
+    frame = _timer().to_frame()
+    assert frame.columns.tolist() == ["stage", "rows", "seconds", "rows_per_sec", "peak_mb", "cached"]
+    parse, distance, charts = frame.to_dict("records")
+    assert parse["rows"] == 1_000_000 and parse["rows_per_sec"] > 0 and parse["peak_mb"] >= 8
+    assert distance["cached"] and np.isnan(distance["rows_per_sec"])
+    assert charts["rows_per_sec"] == 200 and np.isnan(charts["peak_mb"])
+
+
+def test_json_export_and_log_lines(caplog):
+    timer = _timer()
+    exported = json.loads(timer.to_json(file="orders.csv"))
+    assert exported["file"] == "orders.csv"
+    assert [stage["stage"] for stage in exported["stages"]] == ["parse", "distance", "charts"]
+    assert exported["total_seconds"] == sum(stage["seconds"] for stage in exported["stages"])
+
+    with caplog.at_level(logging.INFO, logger="waste.perf"):
+        timer.log(file="orders.csv")
+    lines = [json.loads(record.getMessage()) for record in caplog.records if record.name == "waste.perf"]
+    assert [line["stage"] for line in lines] == ["parse", "distance", "charts"]
+    assert all(line["file"] == "orders.csv" for line in lines)
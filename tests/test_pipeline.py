@@ -0,0 +1,37 @@
+import io
+
+import pytest
+
+from conftest import make_orders
+from pipeline import STAGES, StagedPipeline, content_key
+from waste_engine import analyze
+
+
+def _csv(**kwargs):
+    return make_orders(**kwargs).to_csv(index=False).encode()
+
+
+def test_a_new_category_reuses_parsing_distances_and_weights(postal_index):
+    pipeline = StagedPipeline(postal_index=postal_index)
+    pipeline.run(_csv(), '10001', 'Clothing')
+    assert set(pipeline.last_run.values()) == {"computed"}
+
+    _, aggregates = pipeline.run(_csv(), '10001', 'Home & Living')
+    assert pipeline.last_run == {"parse": "cached", "distance": "cached", "weights": "cached",
+                                 "packaging": "computed", "aggregates": "computed"}
+    _, expected = analyze(io.BytesIO(_csv()), '10001', 'Home & Living', postal_index=postal_index)
+    assert aggregates['total_waste'] == pytest.approx(expected['total_waste'])
+
+    pipeline.run(_csv(), '02108', 'Home & Living')
+    assert pipeline.last_run["parse"] == "cached" and pipeline.last_run["distance"] == "computed"
+
+
+def test_new_input_invalidates_every_stage(postal_index):
+    pipeline = StagedPipeline(postal_index=postal_index)
+    pipeline.run(_csv(), '10001', 'Clothing')
+    assert content_key(_csv(seed=1)) != content_key(_csv())
+    pipeline.run(_csv(seed=1), '10001', 'Clothing')
+    assert pipeline.last_run == {stage: "computed" for stage in STAGES}
+
+    pipeline.run(_csv(), '10001', 'Clothing')  # still memoized
+    assert pipeline.last_run == {stage: "cached" for stage in STAGES}
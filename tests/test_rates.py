@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from rates import RATE_TABLE_DIR, RateStore, build_price_matrix, load_rate_store, match_weights
+
+RATE_TABLE = pd.read_csv(os.path.join(RATE_TABLE_DIR, "usps_retail__2024-01-01.csv"))
+
+
+def idxmin_weight(rate_table, zone, cost):
+    """The original per-row match: ``idxmin`` of the absolute price difference."""
+    diffs = (rate_table[f"Zone {zone}"] - cost).abs()
+    return rate_table.loc[diffs.idxmin(), "weight"]
+
+
+def test_match_weights_agrees_with_idxmin():
+    weights, prices = build_price_matrix(RATE_TABLE)
+    rng = np.random.default_rng(0)
+    zones = rng.integers(1, 9, 500)
+    costs = rng.uniform(0, prices.max() * 1.2, 500).round(2)
+    matched = match_weights(zones, costs, weights, prices)
+    expected = [idxmin_weight(RATE_TABLE, z, c) for z, c in zip(zones, costs)]
+    np.testing.assert_array_equal(matched, expected)
+
+
+def test_ties_go_to_the_lighter_weight():
+    weights, prices = build_price_matrix(RATE_TABLE)
+    zones = np.repeat(np.arange(1, 9), prices.shape[1] - 1)
+    # exactly halfway between neighbouring prices of each zone
+    costs = ((prices[:, :-1] + prices[:, 1:]) / 2).ravel()
+    matched = match_weights(zones, costs, weights, prices)
+    expected = [idxmin_weight(RATE_TABLE, z, c) for z, c in zip(zones, costs)]
+    np.testing.assert_array_equal(matched, expected)
+
+
+def test_missing_cost_gives_nan():
+    weights, prices = build_price_matrix(RATE_TABLE)
+    matched = match_weights([1, 8, 3], [np.nan, 9.0, np.nan], weights, prices)
+    assert np.isnan(matched[[0, 2]]).all()
+    assert matched[1] == idxmin_weight(RATE_TABLE, 8, 9.0)
+
+
+def test_rate_store_prices_each_order_by_its_sale_date():
+    weights, prices = build_price_matrix(RATE_TABLE)
+    store = RateStore({("usps_retail", "2024-01-01"): (weights, prices),
+                       ("usps_retail", "2024-07-01"): (weights, prices * 2)})
+    cost = prices[0, 3]
+    matched = store.match_weights([1, 1, 1], [cost] * 3, ["2023-12-01", "2024-06-30", "2024-07-01"])
+    assert matched[0] == matched[1] == weights[3]
+    assert matched[2] == match_weights([1], [cost], weights, prices * 2)[0]
+
+
+def test_rate_store_is_built_in_the_cache_dir(tmp_path):
+    path = tmp_path / "cache" / "rates.npz"
+    store = load_rate_store(str(path))
+    assert path.exists() and store.services == ["usps_retail"]
+    assert not [name for name in os.listdir(RATE_TABLE_DIR) if not name.endswith(".csv")]
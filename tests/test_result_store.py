@@ -0,0 +1,102 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import result_store  # noqa: E402
+from conftest import make_orders  # noqa: E402
+from rates import DEFAULT_SERVICE  # noqa: E402
+from result_store import AppendStore  # noqa: E402
+
+
+def test_append_store_is_keyed_by_service(tmp_path):
+    retail = AppendStore("10001", "Clothing", root=str(tmp_path))
+    other = AppendStore("10001", "Clothing", "usps_ground", root=str(tmp_path))
+    assert retail.path != other.path
+    assert other.manifest["service"] == "usps_ground"
+
+
+def test_append_prices_with_the_store_service(tmp_path, orders_csv, postal_index, monkeypatch):
+    services = []
+    weight_columns = result_store.weight_columns
+
+    def spy(df_order, distance_cat, service=DEFAULT_SERVICE):
+        services.append(service)
+        return weight_columns(df_order, distance_cat, DEFAULT_SERVICE)
+
+    monkeypatch.setattr(result_store, "weight_columns", spy)
+    store = AppendStore("10001", "Clothing", "usps_ground", root=str(tmp_path))
+    added, _ = store.append(orders_csv, postal_index=postal_index)
+    assert added == 60 and services == ["usps_ground"]
+    with open(os.path.join(store.path, "manifest.json")) as fh:
+        assert json.load(fh)["service"] == "usps_ground"
+
+
+def _aggregates():
+    empty = pd.DataFrame({'package_weight': [1.0]})
+    return {**{name: empty for name in result_store._AGGREGATE_TABLES}, 'total_waste': 1.0, 'order_count': 1}
+
+
+def test_saved_analyses_are_private_to_their_workspace(tmp_path):
+    root = str(tmp_path)
+    mine = result_store.save_analysis(None, _aggregates(), {"file": "a.csv"}, "alice", root=root)
+    result_store.save_analysis(None, _aggregates(), {"file": "b.csv"}, "bob", root=root)
+    assert [meta["id"] for meta in result_store.list_analyses("alice", root=root)] == [mine]
+    with pytest.raises(FileNotFoundError):
+        result_store.load_analysis(mine, "bob", root=root)
+    with pytest.raises(ValueError):
+        result_store.list_analyses("../bob", root=root)
+
+
+def test_saved_analysis_cap_is_per_workspace(tmp_path):
+    root = str(tmp_path)
+    result_store.save_analysis(None, _aggregates(), {}, "bob", root=root)
+    for _ in range(3):
+        result_store.save_analysis(None, _aggregates(), {}, "alice", root=root, max_saved=2)
+    assert len(result_store.list_analyses("alice", root=root)) == 2
+    assert len(result_store.list_analyses("bob", root=root)) == 1
+
+
+def test_stale_workspaces_are_pruned(tmp_path):
+    root = str(tmp_path)
+    result_store.save_analysis(None, _aggregates(), {}, "old", root=root)
+    os.utime(tmp_path / "old", (0, 0))
+    result_store.save_analysis(None, _aggregates(), {}, "new", root=root)
+    assert sorted(os.listdir(root)) == ["new"]
+
+
+def test_histories_are_kept_per_name(tmp_path, orders_csv, postal_index):
+    shop_a = AppendStore("10001", "Clothing", name="Shop A", root=str(tmp_path))
+    shop_b = AppendStore("10001", "Clothing", name="Shop B", root=str(tmp_path))
+    assert shop_a.append(orders_csv, postal_index=postal_index)[0] == 60
+    assert shop_b.append(orders_csv, postal_index=postal_index)[0] == 60
+    assert shop_a.aggregates()['order_count'] == 60
+    with pytest.raises(ValueError):
+        AppendStore("10001", "Clothing", name="--", root=str(tmp_path))
+
+
+def test_rows_without_order_ids_are_deduplicated_by_hash(tmp_path, postal_index):
+    orders = make_orders().drop(columns=['Order ID'])
+    first, later = orders.iloc[:40], orders.iloc[:40].copy()
+    later.loc[len(orders)] = later.iloc[-1]  # a second, identical order on the last processed day
+    later = pd.concat([later, orders.iloc[40:]])
+    first.to_csv(tmp_path / "first.csv", index=False)
+    later.to_csv(tmp_path / "later.csv", index=False)
+
+    store = AppendStore("10001", "Clothing", root=str(tmp_path / "store"))
+    assert store.append(str(tmp_path / "first.csv"), postal_index=postal_index)[0] == 40
+    assert store.manifest["dedup"] == "row_hash"
+    added, aggregates = store.append(str(tmp_path / "later.csv"), postal_index=postal_index)
+    assert added == 21 and aggregates['order_count'] == 61
+    assert store.append(str(tmp_path / "later.csv"), postal_index=postal_index)[0] == 0
+    assert "row_hash" not in store.load_orders()
+
+
+def test_row_hashes_tell_warehouses_and_skus_apart():
+    order = make_orders().drop(columns=['Order ID']).iloc[[0, 0, 0]].reset_index(drop=True)
+    order['Origin Zipcode'] = ['10001', '02108', '10001']
+    order['SKU'] = ['A', 'A', 'B']
+    assert result_store.row_hashes(order).nunique() == 3
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import uncertainty
+from waste_engine import analyze
+
+
+@pytest.fixture
+def enriched(orders_csv, postal_index):
+    return analyze(orders_csv, "10001", "Clothing", postal_index=postal_index, compact=True)
+
+
+@pytest.fixture
+def no_spread(monkeypatch):
+    monkeypatch.setattr(uncertainty, "DISCOUNT_RANGE", (0.78, 0.78))
+    monkeypatch.setattr(uncertainty, "WEIGHT_MATCH_SIGMA", 0.0)
+    monkeypatch.setattr(uncertainty, "PACKAGING_FRACTION_SPREAD", 0.0)
+
+
+@pytest.mark.parametrize("max_cells", [uncertainty.MAX_CELLS, 200, 7])
+def test_without_spread_every_draw_is_the_point_estimate(enriched, no_spread, max_cells):
+    df_order, aggregates = enriched
+    sims = uncertainty.simulate_waste(df_order, "Clothing", draws=20, max_cells=max_cells)
+    assert np.allclose(sims['total'], aggregates['total_waste'])
+    assert np.allclose(sims['monthly'], aggregates['monthly']['package_weight'].to_numpy()[None, :])
+
+
+def test_batches_stay_within_max_cells():
+    # more orders than cells: draws are still batched and the orders chunked
+    per_batch = uncertainty.batch_draws(2000, 5_000_000, 10_000)
+    assert per_batch == uncertainty.MIN_BATCH_DRAWS
+    assert per_batch * 10_000 <= uncertainty.MAX_CELLS
+    assert uncertainty.batch_draws(2000, 1000, 50) == 2000
+
+
+def test_pool_and_progress_give_the_same_draws(enriched):
+    df_order, _ = enriched
+    progress = []
+    local = uncertainty.simulate_waste(df_order, "Clothing", draws=50, max_cells=300,
+                                       on_progress=lambda done, fraction: progress.append(done))
+    pooled = uncertainty.simulate_waste(df_order, "Clothing", draws=50, max_cells=300, processes=2)
+    assert np.array_equal(local['total'], pooled['total'])
+    assert progress[-1] == 50 and progress == sorted(progress)
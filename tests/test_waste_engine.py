@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_orders
+from geo import distance_category
+from test_geo import scalar_miles
+from test_rates import RATE_TABLE, idxmin_weight
+from waste_engine import SHIPPING_DISCOUNT, analyze, analyze_streaming, cube_views, load_memory_report
+
+
+def test_memory_report_compares_a_full_and_a_compact_load(orders_csv):
+    report = load_memory_report(orders_csv)
+    assert report.loc['Order Value', 'after_bytes'] == 0  # pruned by the compact load
+    assert report.loc['Order Value', 'before_bytes'] > 0
+    assert report.loc['TOTAL', 'after_bytes'] < report.loc['TOTAL', 'before_bytes']
+
+
+def test_analyze_matches_a_per_row_reference(postal_index):
+    orders = make_orders()
+    df_order, aggregates = analyze(orders.copy(), '10001', 'Clothing', postal_index=postal_index)
+    us = df_order['Ship Country'] == 'United States'
+    expected_miles = [scalar_miles('10001', z) for z in df_order.loc[us, 'zipcode_to']]
+    np.testing.assert_allclose(df_order.loc[us, 'distance_miles'], expected_miles, rtol=0, atol=1e-3)
+    assert (df_order['distance_cat'] == distance_category(df_order['distance_miles'])).all()
+
+    expected = [idxmin_weight(RATE_TABLE, zone, shipping / SHIPPING_DISCOUNT) * 0.08
+                for zone, shipping in zip(df_order['distance_cat'], df_order['Order Shipping'])]
+    np.testing.assert_allclose(df_order['package_weight'], expected)
+    assert aggregates['total_waste'] == pytest.approx(sum(expected))
+    assert df_order['Sale Date'].is_monotonic_increasing
+
+
+def test_orders_without_a_ship_zipcode_are_zone_8(postal_index):
+    orders = make_orders()
+    orders.loc[3, 'Ship Zipcode'] = None
+    df_order, _ = analyze(orders, '10001', 'Clothing', postal_index=postal_index)
+    assert np.isnan(df_order.loc[3, 'distance_miles']) and df_order.loc[3, 'distance_cat'] == 8
+
+
+def test_compact_and_full_loads_give_the_same_totals(orders_csv, postal_index):
+    full, full_agg = analyze(orders_csv, '02108', 'Clothing', postal_index=postal_index)
+    _, compact_agg = analyze(orders_csv, '02108', 'Clothing', postal_index=postal_index, compact=True)
+    assert (full['zipcode_to'] == '02108').any()  # leading zero kept
+    assert full_agg['total_waste'] == pytest.approx(compact_agg['total_waste'])
+    pd.testing.assert_frame_equal(full_agg['state_sales'], compact_agg['state_sales'], check_dtype=False,
+                                  check_categorical=False)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_streamed_run_matches_the_whole_file(orders_csv, postal_index, compact):
+    _, expected = analyze(orders_csv, '10001', 'Clothing', postal_index=postal_index, compact=compact)
+    seen = []
+    streamed = analyze_streaming(orders_csv, '10001', 'Clothing', chunksize=7, postal_index=postal_index,
+                                 compact=compact, on_chunk=lambda chunk: seen.append(len(chunk)))
+    assert seen == [7] * 8 + [4]
+    assert streamed['order_count'] == expected['order_count']
+    assert streamed['total_waste'] == pytest.approx(expected['total_waste'])
+    for key in ('monthly', 'state_sales'):
+        # compact whole-file loads keep states categorical, chunked loads can't
+        pd.testing.assert_frame_equal(streamed[key], expected[key], check_exact=False, check_dtype=False,
+                                      check_categorical=False)
+
+
+def test_cube_views_filter_by_sale_days_and_zones(postal_index):
+    df_order, aggregates = analyze(make_orders(), '10001', 'Clothing', postal_index=postal_index)
+    view = cube_views(aggregates['cube'], '2024-02-01', '2024-02-29', zones=[5, 6, 7, 8])
+    rows = df_order[df_order['Sale Date'].between('2024-02-01', '2024-02-29') & (df_order['distance_cat'] >= 5)]
+    assert view['order_count'] == len(rows)
+    assert view['total_waste'] == pytest.approx(rows['package_weight'].sum())
+    assert view['monthly']['Sale Date'].dt.month.tolist() == [2]
+    us = rows[rows['Ship Country'] == 'United States']
+    expected = us.groupby('Ship State')['package_weight'].sum()
+    np.testing.assert_allclose(view['state_sales'].set_index('Ship State')['package_weight'],
+                               expected.loc[view['state_sales']['Ship State']])
+
+
+def test_the_full_date_range_keeps_orders_without_a_sale_date(postal_index):
+    orders = make_orders()
+    orders.loc[5, 'Sale Date'] = None
+    _, aggregates = analyze(orders, '10001', 'Clothing', postal_index=postal_index)
+    cube = aggregates['cube']
+    first, last = cube['Sale Date'].min(), cube['Sale Date'].max()
+    full = cube_views(cube, first.date(), last.date())
+    assert full['order_count'] == 60
+    assert full['total_waste'] == pytest.approx(aggregates['total_waste'])
+    assert cube_views(cube, first.date(), last.date() - pd.Timedelta(days=1))['order_count'] < 59
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from centroids import CentroidStore
+from conftest import ZIPS, zip_records
+from geo import distance_category, distance_miles
+from zone_matrix import build_zone_matrix, load_zone_matrix, pair_zone_lookup, zone_lookup
+
+DESTS = pd.Series([z for z, _, _, _ in ZIPS] + ["99999", "abc", None])
+
+
+def test_matrix_zones_match_distance_category(postal_index):
+    # one ZIP per prefix, so every ZIP3 centroid is that ZIP's own centroid
+    matrix = build_zone_matrix(postal_index)
+    for origin, _, _, _ in ZIPS:
+        expected = distance_category(distance_miles(origin, DESTS, postal_index))
+        assert zone_lookup(origin, DESTS, matrix).tolist() == expected[:len(ZIPS)].tolist() + [8, 8, 8]
+    origins = pd.Series([ZIPS[i % len(ZIPS)][0] for i in range(len(DESTS))])
+    pairs = pair_zone_lookup(origins, DESTS, matrix)
+    assert pairs.tolist() == [zone_lookup(o, [d], matrix)[0] for o, d in zip(origins, DESTS)]
+
+
+def test_matrix_is_rebuilt_for_a_new_store_version(tmp_path, postal_index):
+    matrix = load_zone_matrix(postal_index, str(tmp_path))
+    assert os.listdir(tmp_path) == [f"zone_matrix_us-{postal_index.version}.npy"]
+
+    # Los Angeles moved next to Boston: a stale matrix would still say zone 8
+    moved = [(z, 42.36, -71.06, state) if z == "90001" else (z, lat, lon, state) for z, lat, lon, state in ZIPS]
+    rebuilt = CentroidStore(zip_records(moved))
+    assert zone_lookup("02108", ["90001"], matrix)[0] == 8
+    assert zone_lookup("02108", ["90001"], load_zone_matrix(rebuilt, str(tmp_path)))[0] == 1
+    assert os.listdir(tmp_path) == [f"zone_matrix_us-{rebuilt.version}.npy"]
+    np.testing.assert_array_equal(load_zone_matrix(rebuilt, str(tmp_path)), build_zone_matrix(rebuilt))
@@ -0,0 +1,262 @@
+"""Monte Carlo uncertainty bands for the packaging waste estimate.
+
+    python uncertainty.py orders.csv --origin 10001 --category Clothing --processes 4
+
+The point estimate rests on three assumptions; each draw varies all of them:
+
+* the buyer-paid / retail postage ratio (``SHIPPING_DISCOUNT``, 0.78), drawn
+  uniformly from ``DISCOUNT_RANGE`` once per draw,
+* the nearest-price weight match, whose error is a lognormal factor
+  (log-sd ``WEIGHT_MATCH_SIGMA``) drawn per order and draw,
+* the category's packaging share, scaled by a uniform factor in
+  ``1 +/- PACKAGING_FRACTION_SPREAD`` once per draw.
+
+A batch of draws is one (draws x orders) array. Orders are laid out grouped by
+zone and rate table version, and each group's distinct shipping charges are
+matched for all draws in a single sorted search, then spread to its orders;
+the array is then summed per draw, month and state. A batch covers a slice of
+the draws and walks the orders in chunks, adding each chunk's sums into the
+batch's totals, so no array exceeds ``MAX_CELLS`` values however many orders
+there are. Batches can run on a process pool. Every batch has its own seed
+from ``np.random.SeedSequence(seed)``, so the result is the same with or
+without the pool.
+"""
+import argparse
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from rates import DEFAULT_SERVICE, load_rate_store, match_weights
+from waste_engine import CATEGORIES, CATEGORY_PACKAGING_FRACTION, _monthly_frame, analyze, order_shipping
+
+DISCOUNT_RANGE = (0.70, 0.86)
+WEIGHT_MATCH_SIGMA = 0.15
+PACKAGING_FRACTION_SPREAD = 0.25
+DEFAULT_DRAWS = 2000
+DEFAULT_LEVEL = 0.90
+MAX_CELLS = 2_000_000  # draws x orders per chunk (about 16 MB per float64 array)
+MIN_BATCH_DRAWS = 8  # below this, huge uploads are chunked over orders instead of draws
+
+# Set once per worker process by _init_worker
+_worker_orders = None
+
+
+def _runs(*keys):
+    """Start of every run of equal values in the (already sorted) key columns."""
+    if not len(keys[0]):
+        return np.empty(0, dtype=np.intp)
+    changed = np.zeros(len(keys[0]) - 1, dtype=bool)
+    for key in keys:
+        changed |= key[1:] != key[:-1]
+    return np.flatnonzero(np.r_[True, changed])
+
+
+def _one_hot(codes, n_groups):
+    """(len(codes), n_groups) 0/1 matrix; code -1 gets an all-zero row."""
+    matrix = np.zeros((len(codes), n_groups))
+    kept = codes >= 0
+    matrix[np.flatnonzero(kept), codes[kept]] = 1.0
+    return matrix
+
+
+def simulation_inputs(df_order, service=DEFAULT_SERVICE):
+    """The per-order arrays a simulation needs, from an enriched order frame."""
+    store = load_rate_store()
+    zones = df_order['distance_cat'].to_numpy(dtype=np.intp)
+    version_idx = store.version_index(df_order['Sale Date'], service)
+
+    months = pd.PeriodIndex(df_order['Sale Date'], freq='M')
+    first_month = months.min() if len(months) else pd.Period('2000-01', freq='M')
+    month_codes = months.asi8 - first_month.ordinal
+    n_months = int(month_codes.max()) + 1 if len(month_codes) else 0
+
+    us = (df_order['Ship Country'] == 'United States').to_numpy()
+    state_codes = np.full(len(df_order), -1, dtype=np.intp)
+    codes, states = pd.factorize(df_order['Ship State'].astype(object)[us], sort=True)
+    state_codes[us] = codes  # orders without a state keep -1, like the groupby that skips NaN
+
+    # Orders are laid out sorted by (table version, zone, month, state): every
+    # (version, zone) is one contiguous slice for the weight match, and every
+    # (version, zone, month, state) one contiguous segment, so all group sums
+    # come from a single reduceat over the segments.
+    layout = np.lexsort((state_codes, month_codes, zones, version_idx))
+    zones, version_idx = zones[layout], version_idx[layout]
+    month_codes, state_codes = month_codes[layout], state_codes[layout]
+    shipping = order_shipping(df_order).to_numpy(dtype=float)[layout]
+
+    tables = []
+    starts = _runs(version_idx, zones)
+    for start, stop in zip(starts, list(starts[1:]) + [len(layout)]):
+        weights, prices = store.versions[service][version_idx[start]][1:]
+        charges, inverse = np.unique(shipping[start:stop], return_inverse=True)
+        tables.append((start, stop, zones[start], weights, prices, charges, inverse.reshape(-1)))
+
+    segments = _runs(version_idx, zones, month_codes, state_codes)
+    return {
+        'orders': len(layout),
+        'tables': tables,
+        'segments': segments,
+        'segment_months': _one_hot(month_codes[segments], n_months),
+        'segment_states': _one_hot(state_codes[segments], len(states)),
+        'month_labels': pd.period_range(first_month, periods=n_months, freq='M'),
+        'state_labels': pd.Index(states, name='Ship State'),
+    }
+
+
+def _matched_chunk(orders, discount, start, stop):
+    """(draws, stop - start) matched weights of orders ``start:stop`` at each draw's discount."""
+    matched = np.empty((len(discount), stop - start))
+    for t_start, t_stop, zone, weights, prices, charges, inverse in orders['tables']:
+        first, last = max(t_start, start), min(t_stop, stop)
+        if first >= last:
+            continue
+        if first == t_start and last == t_stop:
+            used, local = slice(None), inverse
+        else:  # only the charges of this chunk's orders are matched
+            used, local = np.unique(inverse[first - t_start:last - t_start], return_inverse=True)
+        cost = charges[used][None, :] / discount[:, None]
+        weight = match_weights(np.full(cost.size, zone), cost.ravel(), weights, prices).reshape(cost.shape)
+        matched[:, first - start:last - start] = weight[:, local.reshape(-1)]
+    return matched
+
+
+def simulate_batch(orders, category, draws, seed, max_cells=MAX_CELLS):
+    """``(totals, monthly, states)`` per-draw waste sums for one batch of draws."""
+    rng = np.random.default_rng(seed)
+    discount = rng.uniform(*DISCOUNT_RANGE, size=draws)
+    fraction = CATEGORY_PACKAGING_FRACTION[category] * rng.uniform(
+        1 - PACKAGING_FRACTION_SPREAD, 1 + PACKAGING_FRACTION_SPREAD, size=draws)
+
+    segments = orders['segments']
+    segment_sums = np.zeros((draws, len(segments)))
+    chunk = max(1, max_cells // draws)
+    for start in range(0, orders['orders'], chunk):
+        stop = min(start + chunk, orders['orders'])
+        matched = _matched_chunk(orders, discount, start, stop)
+        # lognormal weight-match error, drawn in float32 to halve the cost of the largest draw
+        noise = rng.standard_normal(matched.shape, dtype=np.float32)
+        noise *= WEIGHT_MATCH_SIGMA
+        np.exp(noise, out=noise)
+        matched *= noise
+        matched *= fraction[:, None]
+        waste = np.nan_to_num(matched, copy=False)  # orders without a shipping charge add nothing
+        # segments overlapping the chunk; the first may have started in an earlier chunk
+        first = np.searchsorted(segments, start, side="right") - 1
+        last = np.searchsorted(segments, stop, side="left")
+        starts = np.maximum(segments[first:last], start) - start
+        segment_sums[:, first:last] += np.add.reduceat(waste, starts, axis=1)
+    return (segment_sums.sum(axis=1), segment_sums @ orders['segment_months'],
+            segment_sums @ orders['segment_states'])
+
+
+def _init_worker(orders):
+    global _worker_orders
+    _worker_orders = orders
+
+
+def _run_batch(category, draws, seed, max_cells):
+    return simulate_batch(_worker_orders, category, draws, seed, max_cells)
+
+
+def batch_draws(draws, n_orders, n_segments, max_cells=MAX_CELLS):
+    """Draws per batch: all orders in one chunk when that fits in ``max_cells``, else
+    at least ``MIN_BATCH_DRAWS`` (chunking the orders) while the per-segment sums fit."""
+    per_batch = max_cells // max(n_orders, 1)
+    if per_batch < MIN_BATCH_DRAWS:
+        per_batch = min(MIN_BATCH_DRAWS, max_cells // max(n_segments, 1))
+    return max(1, min(draws, per_batch))
+
+
+def simulate_waste(df_order, category, draws=DEFAULT_DRAWS, seed=0, service=DEFAULT_SERVICE,
+                   max_cells=MAX_CELLS, processes=None, on_progress=None):
+    """Waste per draw for an enriched order frame.
+
+    Returns ``{'total': (draws,), 'monthly': (draws, months), 'states': (draws, states),
+    'month_labels': PeriodIndex, 'state_labels': Index}``. With ``processes`` > 1
+    the batches run on that many worker processes. ``on_progress(draws_done, fraction)``
+    is called on the calling thread after every batch.
+    """
+    if category not in CATEGORY_PACKAGING_FRACTION:
+        raise ValueError(f"Unknown business category {category!r}")
+    orders = simulation_inputs(df_order, service)
+    per_batch = batch_draws(draws, orders['orders'], len(orders['segments']), max_cells)
+    sizes = [min(per_batch, draws - start) for start in range(0, draws, per_batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    def track(results):
+        done = 0
+        for size, batch in zip(sizes, results):
+            done += size
+            if on_progress is not None:
+                on_progress(done, done / draws)
+            yield batch
+
+    if processes and processes > 1 and len(sizes) > 1:
+        context = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                 initializer=_init_worker, initargs=(orders,)) as pool:
+            batches = list(track(pool.map(_run_batch, [category] * len(sizes), sizes, seeds,
+                                          [max_cells] * len(sizes))))
+    else:
+        batches = list(track(simulate_batch(orders, category, size, batch_seed, max_cells)
+                             for size, batch_seed in zip(sizes, seeds)))
+
+    totals, monthly, states = (np.concatenate(parts) for parts in zip(*batches))
+    return {'total': totals, 'monthly': monthly, 'states': states,
+            'month_labels': orders['month_labels'], 'state_labels': orders['state_labels']}
+
+
+def _bands(samples, level):
+    low, median, high = np.percentile(samples, [50 * (1 - level), 50, 50 * (1 + level)], axis=0)
+    return {'low': low, 'median': median, 'high': high}
+
+
+def waste_intervals(df_order, category, level=DEFAULT_LEVEL, **simulate_options):
+    """``level`` confidence intervals (with the median) on total, monthly and per-state waste.
+
+    ``monthly`` and ``state_sales`` are labelled like the ``aggregate`` tables of the same
+    name; ``simulate_options`` are passed to ``simulate_waste``.
+    """
+    sims = simulate_waste(df_order, category, **simulate_options)
+    monthly = pd.DataFrame(_bands(sims['monthly'], level), index=sims['month_labels'])
+    monthly = pd.concat([_monthly_frame(monthly[column]).set_index('Sale Date')[['package_weight']]
+                         .rename(columns={'package_weight': column}) for column in monthly], axis=1)
+    return {
+        'level': level,
+        'draws': len(sims['total']),
+        'total': {name: float(value) for name, value in _bands(sims['total'], level).items()},
+        'monthly': monthly.reset_index(),
+        'state_sales': pd.DataFrame(_bands(sims['states'], level), index=sims['state_labels']).reset_index(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confidence intervals on the packaging waste of an orders CSV.")
+    parser.add_argument("orders_csv")
+    parser.add_argument("--origin", required=True, help="5-digit origin ZIP")
+    parser.add_argument("--category", required=True, choices=CATEGORIES)
+    parser.add_argument("--service", default=DEFAULT_SERVICE)
+    parser.add_argument("--draws", type=int, default=DEFAULT_DRAWS)
+    parser.add_argument("--level", type=float, default=DEFAULT_LEVEL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: run in-process)")
+    args = parser.parse_args(argv)
+
+    df_order, _ = analyze(args.orders_csv, args.origin, args.category, compact=True, service=args.service)
+    intervals = waste_intervals(df_order, args.category, args.level, draws=args.draws, seed=args.seed,
+                                service=args.service, processes=args.processes)
+    total = intervals['total']
+    print(f"total: {total['low']:.2f} - {total['high']:.2f} lbs (median {total['median']:.2f}, "
+          f"{args.level:.0%} interval, {intervals['draws']} draws)")
+    print(intervals['monthly'].round(2).to_string(index=False))
+    print(intervals['state_sales'].round(2).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
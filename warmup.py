@@ -0,0 +1,33 @@
+"""Load slow, process-wide datasets on a background thread at startup.
+
+    start_warmup(load_postal_index, load_rate_store)
+
+Each loader is expected to cache its result for the process (``lru_cache``) and
+to be safe to call from several threads, so a run that starts before the
+warm-up is done simply waits for the same load instead of repeating it.
+Failures are logged and otherwise ignored: the foreground call will hit (and
+report) the same error when it actually needs the data.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger("waste.warmup")
+
+
+def _warm(loaders):
+    for loader in loaders:
+        start = time.perf_counter()
+        try:
+            loader()
+        except Exception:
+            logger.exception("warm-up of %s failed", getattr(loader, "__name__", loader))
+            continue
+        logger.info("warmed %s in %.2fs", getattr(loader, "__name__", loader), time.perf_counter() - start)
+
+
+def start_warmup(*loaders):
+    """Call ``loaders`` in order on a daemon thread; returns the started thread."""
+    thread = threading.Thread(target=_warm, args=(loaders,), name="waste-warmup", daemon=True)
+    thread.start()
+    return thread
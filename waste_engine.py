@@ -0,0 +1,531 @@
+"""Headless packaging-waste estimation engine.
+
+Everything the Streamlit app computes, without importing Streamlit or Plotly, so
+it can be imported by other tools or run as a nightly batch job:
+
+    python waste_engine.py ORDERS_DIR --origin 10001 --category "Clothing" --out results/
+
+Orders can ship from several warehouses: an ``Origin Zipcode`` column in the CSV,
+or ``--sku-origins MAP.csv`` (columns ``SKU``, ``origin_zip``), sets each order's
+origin; ``--origin`` is used for the rest. Add ``--chunksize N`` to stream very
+large exports in chunks of N rows with flat memory use, or ``--zip3-zones`` to
+take zones from the precomputed ZIP3 zone matrix (zone_matrix.py) instead of
+geocoding every destination.
+"""
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from distance_cache import DistanceCache, cached_distances, cached_pair_distances
+from geo import distance_category, distance_miles, pair_distance_miles
+from rates import DEFAULT_SERVICE, load_rate_store
+from zone_matrix import load_zone_matrix, pair_zone_lookup, zone_lookup
+
+# Packaging weight fraction defaults by category (fraction of shipped weight)
+CATEGORY_PACKAGING_FRACTION = {
+    "Jewelry & Accessories": 0.20,     # small item + protective mailer/paper
+    "Clothing": 0.08,                  # poly/paper mailer + minimal inner wrap
+    "Home & Living": 0.05,             # larger/heavier items; packaging is a smaller share
+    "Art & Prints": 0.15,              # rigid mailers/tubes + flat protection
+    "Bags & Purses": 0.10,
+    "Bath, Beauty, & Health": 0.12,    # jars/tins/inner wraps can add weight
+    "Toys, Games, & Kids": 0.09,
+    "Books, Music, & Media": 0.07,     # rigid mailer/box, modest padding
+    "Food & Beverages": 0.12,          # food-safe inner + cushioning
+    "Stationery & Small Gifts": 0.19,
+}
+CATEGORIES = list(CATEGORY_PACKAGING_FRACTION)
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# The only Sold Orders columns the model reads
+ORDER_COLUMNS = ['Sale Date', 'Ship Zipcode', 'Order Shipping', 'Ship State', 'Ship Country']
+ORDER_ID_COLUMN = 'Order ID'
+# Optional columns for sellers shipping from several warehouses
+ORIGIN_COLUMN = 'Origin Zipcode'
+SKU_COLUMN = 'SKU'
+# dtypes used by compact loading; ZIPs become categoricals of 5-character codes
+LOAD_DTYPES = {'Ship Zipcode': str, 'Order Shipping': 'float32',
+               'Ship State': 'category', 'Ship Country': 'category',
+               ORIGIN_COLUMN: str, SKU_COLUMN: str}
+COMPACT_DTYPES = {
+    **{col: dtype for col, dtype in LOAD_DTYPES.items() if dtype != str},
+    'Ship Zipcode': 'category',
+    ORIGIN_COLUMN: 'category',
+    'zipcode_from': 'category',
+    'zipcode_to': 'category',
+    'distance_miles': 'float32',
+    'distance_cat': 'uint8',
+    'shipping_cost': 'float32',
+    'matched_weight': 'float32',
+    'package_weight': 'float32',
+}
+
+# Order Shipping is what the buyer paid; retail postage is roughly Order Shipping / 0.78
+SHIPPING_DISCOUNT = 0.78
+
+
+def is_valid_zip(zipcode):
+    return zipcode.isdigit() and len(zipcode) == 5
+
+
+def _csv_options(compact, extra_columns=()):
+    if not compact:
+        # ZIPs and SKUs are codes, not numbers (keep leading zeros)
+        return {'dtype': {'Ship Zipcode': str, ORIGIN_COLUMN: str, SKU_COLUMN: str}}
+    wanted = set(ORDER_COLUMNS).union([ORIGIN_COLUMN, SKU_COLUMN], extra_columns)
+    return {'usecols': lambda col: col in wanted, 'dtype': LOAD_DTYPES}
+
+
+def _compact_zips(df_order):
+    missing = [col for col in ORDER_COLUMNS if col not in df_order]
+    if missing:
+        raise ValueError(f"Orders CSV is missing columns: {', '.join(missing)}")
+    df_order['Ship Zipcode'] = df_order['Ship Zipcode'].fillna('').str[:5].astype('category')
+    if ORIGIN_COLUMN in df_order:
+        df_order[ORIGIN_COLUMN] = df_order[ORIGIN_COLUMN].str[:5].astype('category')
+    return df_order
+
+
+def load_orders(source, compact=False, extra_columns=()):
+    """Read a Sold Orders CSV (path or file-like object).
+
+    With ``compact`` only ``ORDER_COLUMNS`` (plus the origin/SKU columns and any
+    ``extra_columns`` present) are read, ZIPs are kept as 5-character category
+    codes (leading zeros preserved), state/country as categories and money as
+    float32.
+    """
+    df_order = pd.read_csv(source, **_csv_options(compact, extra_columns))
+    return _compact_zips(df_order) if compact else df_order
+
+
+def compact_orders(df_order):
+    """Downcast an (enriched) order frame to the compact dtypes for storage."""
+    dtypes = {col: dtype for col, dtype in COMPACT_DTYPES.items() if col in df_order}
+    return df_order.astype(dtypes)
+
+
+def memory_report(before, after):
+    """Deep memory use in bytes per column of two versions of a frame, plus a total row.
+
+    Columns missing from ``after`` (e.g. pruned at load time) show 0 there.
+    """
+    report = pd.DataFrame({
+        'before_bytes': before.memory_usage(deep=True, index=False),
+        'after_bytes': after.memory_usage(deep=True, index=False),
+    }).fillna(0).astype('int64')
+    report.loc['TOTAL'] = report.sum()
+    return report
+
+
+def load_memory_report(source):
+    """``memory_report`` of a full load of ``source`` (every column, default dtypes)
+    against the column-pruned compact load the model uses."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    full = load_orders(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return memory_report(full, load_orders(source, compact=True))
+
+
+def validate_inputs(zipcode_from, category):
+    if not is_valid_zip(zipcode_from):
+        raise ValueError(f"Origin ZIP must be 5 digits, got {zipcode_from!r}")
+    if category not in CATEGORY_PACKAGING_FRACTION:
+        raise ValueError(f"Unknown business category {category!r}")
+
+
+# The pipeline runs in stages so callers (see pipeline.StagedPipeline) can reuse
+# earlier results: each stage only returns the columns it adds.
+
+def prepare_orders(df_order):
+    """Parse stage: destination ZIP and parsed Sale Date, sorted by date."""
+    df_order = df_order.copy()
+    zips = df_order['Ship Zipcode']
+    if isinstance(zips.dtype, pd.CategoricalDtype):
+        df_order['zipcode_to'] = zips  # compact loading already keeps 5-character codes
+    else:
+        df_order['zipcode_to'] = zips.astype(str).str[:5]
+    df_order['Sale Date'] = pd.to_datetime(df_order['Sale Date'])
+    return df_order.sort_values('Sale Date')
+
+
+def order_origins(df_order, zipcode_from, sku_origins=None):
+    """Origin ZIP of every order as a categorical ``zipcode_from`` column.
+
+    Taken from the ``Origin Zipcode`` column when it is filled in, else from the
+    order's ``SKU`` in ``sku_origins`` ({sku: origin ZIP}), else ``zipcode_from``.
+    """
+    origins = pd.Series(zipcode_from, index=df_order.index, dtype=object)
+    if sku_origins and SKU_COLUMN in df_order:
+        origins = df_order[SKU_COLUMN].astype(object).map(sku_origins).fillna(origins)
+    if ORIGIN_COLUMN in df_order:
+        column = df_order[ORIGIN_COLUMN].astype(object).astype(str).str[:5]
+        origins = column.where(df_order[ORIGIN_COLUMN].notna() & (column != ''), origins)
+    origins = origins.astype('category').rename('zipcode_from')
+    bad = [zipcode for zipcode in origins.cat.categories if not is_valid_zip(zipcode)]
+    if bad:
+        raise ValueError(f"Origin ZIPs must be 5 digits, got {', '.join(map(repr, bad))}")
+    return origins
+
+
+def distance_columns(df_order, zipcode_from, distance_cache=None, postal_index=None, zone_matrix=None,
+                     sku_origins=None):
+    """Distance stage: origin ZIP, miles from it and zone 1-8 (8 if foreign/unknown).
+
+    Orders may have different origins (see ``order_origins``); all (origin,
+    destination) pairs are then handled in one batched pass. With a ``zone_matrix``
+    (see zone_matrix.py) the zone is looked up from the ZIP3 pair and there are no miles.
+    """
+    origins = order_origins(df_order, zipcode_from, sku_origins)
+    zipcodes_to = df_order['zipcode_to']
+    single = origins.cat.categories[0] if len(origins.cat.categories) == 1 else None
+    if zone_matrix is not None:
+        if single is not None:
+            zones = zone_lookup(single, zipcodes_to, zone_matrix)
+        else:
+            zones = pair_zone_lookup(origins, zipcodes_to, zone_matrix)
+        return pd.DataFrame({'zipcode_from': origins, 'distance_cat': zones}, index=df_order.index)
+    if single is not None and distance_cache is not None:
+        miles, cats = cached_distances(single, zipcodes_to, distance_cache, postal_index)
+    elif distance_cache is not None:
+        miles, cats = cached_pair_distances(origins, zipcodes_to, distance_cache, postal_index)
+    else:
+        if single is not None:
+            miles = distance_miles(single, zipcodes_to, postal_index)
+        else:
+            miles = pair_distance_miles(origins, zipcodes_to, postal_index)
+        cats = distance_category(miles)
+    return pd.DataFrame({'zipcode_from': origins, 'distance_miles': miles, 'distance_cat': cats},
+                        index=df_order.index)
+
+
+def order_shipping(df_order):
+    """What the buyer paid for shipping, as exact float64 cents."""
+    shipping = df_order['Order Shipping']
+    if shipping.dtype == np.float32:
+        # compact loading keeps money as float32; recover the exact cents first
+        shipping = shipping.astype(float).round(2)
+    return shipping
+
+
+def weight_columns(df_order, distance_cat, service=DEFAULT_SERVICE):
+    """Weight-match stage: retail shipping cost and the nearest USPS zone price's weight,
+    using the ``service`` rate table in effect on each order's Sale Date."""
+    shipping_cost = order_shipping(df_order) / SHIPPING_DISCOUNT
+    matched = load_rate_store().match_weights(distance_cat, shipping_cost, df_order['Sale Date'], service)
+    return pd.DataFrame({'shipping_cost': shipping_cost, 'matched_weight': matched}, index=df_order.index)
+
+
+def packaging_column(matched_weight, category):
+    """Packaging stage: the category's share of the shipped weight."""
+    return (matched_weight * CATEGORY_PACKAGING_FRACTION[category]).rename('package_weight')
+
+
+def enrich_orders(df_order, zipcode_from, category, distance_cache=None, postal_index=None, zone_matrix=None,
+                  sku_origins=None, service=DEFAULT_SERVICE):
+    """Add distance, zone, matched weight and packaging weight columns.
+
+    Returns a new frame sorted by ``Sale Date``. With a ``distance_cache`` only
+    (origin, destination) pairs it has not seen yet are geocoded; with a
+    ``zone_matrix`` nothing is geocoded and there is no miles column.
+    ``zipcode_from`` is the origin of orders without their own (see ``order_origins``).
+    """
+    validate_inputs(zipcode_from, category)
+    df_order = prepare_orders(df_order)
+    distances = distance_columns(df_order, zipcode_from, distance_cache, postal_index, zone_matrix, sku_origins)
+    weights = weight_columns(df_order, distances['distance_cat'], service)
+    package = packaging_column(weights['matched_weight'], category)
+    return pd.concat([df_order, distances, weights, package], axis=1)
+
+
+def monthly_totals(df_order):
+    """Packaging waste per calendar month, labelled by month end, empty months as 0."""
+    months = df_order['Sale Date'].dt.to_period('M')
+    return _monthly_frame(df_order.groupby(months)['package_weight'].sum())
+
+
+def _monthly_frame(monthly):
+    """Turn per-Period sums into the monthly table the dashboard plots."""
+    if len(monthly):
+        all_months = pd.period_range(monthly.index.min(), monthly.index.max(), freq='M')
+        monthly = monthly.reindex(all_months, fill_value=0)
+    monthly.index = monthly.index.to_timestamp(how='end').normalize()
+    monthly.index.name = 'Sale Date'
+    return monthly.rename('package_weight').reset_index()
+
+
+def state_totals(df_order):
+    """Packaging waste per U.S. state."""
+    us_sales = df_order[df_order['Ship Country'] == 'United States']
+    return us_sales.groupby('Ship State', observed=True)['package_weight'].sum().reset_index()
+
+
+# Every dashboard view is answered from the waste cube: package weight and order
+# count summed per (day, state, country, zone), which is far smaller than the orders.
+CUBE_KEYS = ['Sale Date', 'zipcode_from', 'Ship State', 'Ship Country', 'distance_cat']
+CUBE_VALUES = ['package_weight', 'orders']
+
+
+def waste_cube(df_order):
+    """Packaging waste and order count per ``CUBE_KEYS`` for an enriched order frame."""
+    keys = [df_order['Sale Date'].dt.normalize(), df_order['zipcode_from'], df_order['Ship State'],
+            df_order['Ship Country'], df_order['distance_cat'].astype('uint8')]
+    cube = df_order['package_weight'].groupby(keys, dropna=False, observed=True).agg(['sum', 'size'])
+    return cube.set_axis(CUBE_VALUES, axis=1).reset_index()
+
+
+def merge_cubes(cubes):
+    """Add up cubes (e.g. of separate chunks) into one."""
+    cubes = [cube for cube in cubes if cube is not None]
+    if len(cubes) == 1:
+        return cubes[0]
+    merged = pd.concat(cubes, ignore_index=True)
+    return merged.groupby(CUBE_KEYS, dropna=False, observed=True)[CUBE_VALUES].sum().reset_index()
+
+
+def filter_cube(cube, start=None, end=None, zones=None):
+    """The cube rows for sale days ``start``..``end`` (inclusive) and the given zones.
+
+    A range spanning every sale day also keeps the orders without a Sale Date, so
+    the default, full range adds up to the unfiltered totals.
+    """
+    keep = np.ones(len(cube), dtype=bool)
+    dates = cube['Sale Date']
+    if start is not None and pd.Timestamp(start) > dates.min():
+        keep &= (dates >= pd.Timestamp(start)).to_numpy()
+    if end is not None and pd.Timestamp(end) < dates.max():
+        keep &= (dates <= pd.Timestamp(end)).to_numpy()
+    if zones is not None:
+        keep &= cube['distance_cat'].isin(list(zones)).to_numpy()
+    return cube[keep]
+
+
+def cube_views(cube, start=None, end=None, zones=None):
+    """Dashboard aggregates from a waste cube, optionally limited to sale days
+    ``start``..``end`` (inclusive) and to the given zones."""
+    cube = filter_cube(cube, start, end, zones)
+
+    daily = cube.groupby('Sale Date')['package_weight'].sum()
+    monthly = daily.groupby(pd.PeriodIndex(daily.index, freq='M')).sum()
+    us_sales = cube[cube['Ship Country'] == 'United States']
+    states = us_sales.groupby('Ship State', observed=True)['package_weight'].sum()
+    origins = cube.groupby('zipcode_from', observed=True)[CUBE_VALUES].sum()
+    return {
+        'total_waste': float(cube['package_weight'].sum()),
+        'order_count': int(cube['orders'].sum()),
+        'monthly': _monthly_frame(monthly),
+        'state_sales': states.reset_index(),
+        'origin_sales': origins.reset_index(),
+        'cumulative': pd.DataFrame({'Sale Date': daily.index, 'Cumulative Waste': daily.cumsum().to_numpy()}),
+    }
+
+
+def aggregate(df_order):
+    """Dashboard aggregates for an enriched order frame, plus the ``cube`` they come from.
+
+    The cumulative series has one point per day.
+    """
+    cube = waste_cube(df_order)
+    return {**cube_views(cube), 'cube': cube}
+
+
+def analyze(orders, zipcode_from, category, distance_cache=None, postal_index=None, compact=False,
+            zone_matrix=None, sku_origins=None, service=DEFAULT_SERVICE):
+    """Run the full estimation on a DataFrame or CSV path/buffer.
+
+    Returns ``(enriched_orders, aggregates)``. With ``compact`` the CSV is loaded
+    column-pruned and the returned frame uses ``COMPACT_DTYPES``; aggregates are
+    computed before downcasting, so they are unchanged.
+    """
+    df_order = orders if isinstance(orders, pd.DataFrame) else load_orders(orders, compact)
+    df_order = enrich_orders(df_order, zipcode_from, category, distance_cache, postal_index, zone_matrix,
+                             sku_origins, service)
+    aggregates = aggregate(df_order)
+    return (compact_orders(df_order) if compact else df_order), aggregates
+
+
+class RunningAggregates:
+    """Running version of ``aggregate`` that enriched chunks are folded into.
+
+    Only the waste cube is kept, so memory grows with days x states x zones, not
+    with the number of orders.
+    """
+
+    def __init__(self):
+        self.total_waste = 0.0
+        self.order_count = 0
+        self.cube = None
+
+    def update(self, df_order):
+        self.total_waste += float(df_order['package_weight'].sum())
+        self.order_count += len(df_order)
+        self.cube = merge_cubes([self.cube, waste_cube(df_order)])
+
+    def to_frames(self):
+        """The running sums as plain DataFrames, e.g. for saving to disk."""
+        return {'cube': self._cube()}
+
+    @classmethod
+    def from_frames(cls, frames, total_waste, order_count):
+        """Rebuild running aggregates saved with ``to_frames``."""
+        running = cls()
+        running.total_waste = total_waste
+        running.order_count = order_count
+        running.cube = frames['cube']
+        return running
+
+    def _cube(self):
+        if self.cube is not None:
+            return self.cube
+        return pd.DataFrame({'Sale Date': pd.Series(dtype='datetime64[ns]'),
+                             'zipcode_from': pd.Series(dtype=object), 'Ship State': pd.Series(dtype=object),
+                             'Ship Country': pd.Series(dtype=object), 'distance_cat': pd.Series(dtype='uint8'),
+                             'package_weight': pd.Series(dtype=float), 'orders': pd.Series(dtype='int64')})
+
+    def result(self):
+        cube = self._cube()
+        return {**cube_views(cube), 'total_waste': self.total_waste, 'order_count': self.order_count, 'cube': cube}
+
+
+def analyze_streaming(source, zipcode_from, category, chunksize=DEFAULT_CHUNKSIZE,
+                      distance_cache=None, postal_index=None, on_chunk=None, compact=False,
+                      zone_matrix=None, sku_origins=None, service=DEFAULT_SERVICE):
+    """Like ``analyze`` but reads the CSV ``chunksize`` rows at a time.
+
+    Each enriched chunk is passed to ``on_chunk`` (if given) and then dropped;
+    only the running aggregates are returned. ``compact`` loads chunks like
+    ``load_orders(compact=True)``.
+    """
+    running = RunningAggregates()
+    for chunk in pd.read_csv(source, chunksize=chunksize, **_csv_options(compact)):
+        if compact:
+            chunk = _compact_zips(chunk)
+        chunk = enrich_orders(chunk, zipcode_from, category, distance_cache, postal_index, zone_matrix,
+                              sku_origins, service)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        running.update(chunk)
+    return running.result()
+
+
+def process_file(path, zipcode_from, category, out_dir, name=None, distance_cache=None, chunksize=None,
+                 compact=False, zone_matrix=None, sku_origins=None, service=DEFAULT_SERVICE):
+    """Analyze one orders CSV and write ``<name>_orders/_monthly/_states.csv`` to ``out_dir``,
+    plus ``<name>_origins.csv`` when orders ship from more than one origin.
+
+    Returns a summary row for the file.
+    """
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    orders_path = os.path.join(out_dir, f"{name}_orders.csv")
+    if chunksize:
+        if os.path.exists(orders_path):
+            os.remove(orders_path)
+
+        def write_chunk(chunk):
+            chunk.to_csv(orders_path, mode="a", index=False, header=not os.path.exists(orders_path))
+
+        agg = analyze_streaming(path, zipcode_from, category, chunksize, distance_cache,
+                                on_chunk=write_chunk, compact=compact, zone_matrix=zone_matrix,
+                                sku_origins=sku_origins, service=service)
+    else:
+        df_order, agg = analyze(path, zipcode_from, category, distance_cache, compact=compact,
+                                zone_matrix=zone_matrix, sku_origins=sku_origins, service=service)
+        df_order.to_csv(orders_path, index=False)
+    agg['monthly'].to_csv(os.path.join(out_dir, f"{name}_monthly.csv"), index=False)
+    agg['state_sales'].to_csv(os.path.join(out_dir, f"{name}_states.csv"), index=False)
+    if len(agg['origin_sales']) > 1:
+        agg['origin_sales'].to_csv(os.path.join(out_dir, f"{name}_origins.csv"), index=False)
+    return {'file': os.path.basename(path), 'orders': agg['order_count'],
+            'total_waste_lbs': round(agg['total_waste'], 2)}
+
+
+def load_sku_origins(path):
+    """{SKU: origin ZIP} from a CSV with ``SKU`` and ``origin_zip`` columns."""
+    mapping = pd.read_csv(path, dtype=str)
+    missing = [col for col in (SKU_COLUMN, 'origin_zip') if col not in mapping.columns]
+    if missing:
+        raise ValueError(f"{getattr(path, 'name', path)} is missing columns: {', '.join(missing)}")
+    return dict(zip(mapping[SKU_COLUMN], mapping['origin_zip'].str.strip()))
+
+
+def _append_files(paths, zipcode_from, category, out_dir, distance_cache, sku_origins=None,
+                  service=DEFAULT_SERVICE, name=None):
+    from result_store import AppendStore  # needs pyarrow
+
+    store = AppendStore(zipcode_from, category, service, name=name)
+    for path in paths:
+        added, agg = store.append(path, distance_cache, sku_origins=sku_origins)
+        print(f"{os.path.basename(path)}: {added} new orders", file=sys.stderr)
+    agg['monthly'].to_csv(os.path.join(out_dir, "history_monthly.csv"), index=False)
+    agg['state_sales'].to_csv(os.path.join(out_dir, "history_states.csv"), index=False)
+    print(f"history: {agg['order_count']} orders, {agg['total_waste']:.2f} lbs", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate packaging waste for a directory of Sold Orders CSVs.")
+    parser.add_argument("orders_dir", help="directory containing Sold Orders CSV files")
+    parser.add_argument("--origin", required=True, help="5-digit origin ZIP code")
+    parser.add_argument("--category", required=True, choices=CATEGORIES, help="business category")
+    parser.add_argument("--out", default="waste_results", help="output directory (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="don't use the on-disk distance cache")
+    parser.add_argument("--sku-origins", default=None,
+                        help="CSV mapping SKU to origin_zip for orders shipped from other warehouses")
+    parser.add_argument("--service", default=DEFAULT_SERVICE,
+                        help="rate table service (see: python rates.py list; default: %(default)s)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream each CSV in chunks of this many rows (per-order output keeps file order)")
+    parser.add_argument("--compact", action="store_true",
+                        help="read only the needed columns and keep compact dtypes in memory")
+    parser.add_argument("--append", action="store_true",
+                        help="add only unseen orders to the saved history for this origin/category/service "
+                             "and write the updated history aggregates")
+    parser.add_argument("--history-name", default=None,
+                        help="with --append: seller name keeping its own history (default: the unnamed history)")
+    parser.add_argument("--zip3-zones", action="store_true",
+                        help="look zones up in the precomputed ZIP3 zone matrix instead of geocoding "
+                             "(faster; no distance_miles column)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="also write <name>_memory.csv comparing per-column memory of a full vs compact load")
+    args = parser.parse_args(argv)
+
+    if not is_valid_zip(args.origin):
+        parser.error("--origin must be a 5-digit ZIP code")
+    if args.service not in load_rate_store().services:
+        parser.error(f"unknown --service {args.service!r}, have: {', '.join(load_rate_store().services)}")
+    paths = sorted(glob.glob(os.path.join(args.orders_dir, "*.csv")))
+    if not paths:
+        parser.error(f"no CSV files found in {args.orders_dir}")
+
+    if args.append and args.zip3_zones:
+        parser.error("--zip3-zones can't be used with --append (the saved history uses geocoded zones)")
+    distance_cache = None if args.no_cache else DistanceCache()
+    zone_matrix = load_zone_matrix() if args.zip3_zones else None
+    sku_origins = load_sku_origins(args.sku_origins) if args.sku_origins else None
+    os.makedirs(args.out, exist_ok=True)
+    if args.append:
+        return _append_files(paths, args.origin, args.category, args.out, distance_cache, sku_origins,
+                             args.service, args.history_name)
+    summary = []
+    for path in paths:
+        row = process_file(path, args.origin, args.category, args.out,
+                           distance_cache=distance_cache, chunksize=args.chunksize, compact=args.compact,
+                           zone_matrix=zone_matrix, sku_origins=sku_origins, service=args.service)
+        if args.memory_report:
+            name = os.path.splitext(os.path.basename(path))[0]
+            load_memory_report(path).to_csv(os.path.join(args.out, f"{name}_memory.csv"))
+        summary.append(row)
+        print(f"{row['file']}: {row['orders']} orders, {row['total_waste_lbs']:.2f} lbs", file=sys.stderr)
+
+    pd.DataFrame(summary).to_csv(os.path.join(args.out, "summary.csv"), index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Precomputed USPS-style zones for every pair of 3-digit ZIP prefixes.
+
+USPS zone charts are keyed by (origin ZIP3, destination ZIP3). The matrix here is a
+1000 x 1000 uint8 array built once from the ZIP3 centroids of the offline ZIP
+centroid store (zone of the centroid-to-centroid mileage, same bins as ``geo.distance_category``)
+and saved as ``.npy``; later runs memory-map it, so a zone is one array lookup per
+unique destination instead of geocoding plus a haversine. The file name carries the
+centroid store's version (``geo.postal_index_version``), so rebuilding the store
+with other data builds a new matrix instead of reusing a stale one.
+
+Prefixes without any geocoded ZIP, foreign and malformed ZIPs are zone 8. Unlike the
+exact-mileage path, an unknown ZIP inside a known prefix gets its prefix's zone.
+"""
+import functools
+import glob
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from distance_cache import CACHE_DIR
+from geo import (
+    KM_TO_MILES,
+    distance_category,
+    factorize_pairs,
+    factorize_zips,
+    haversine_km,
+    load_postal_index,
+    postal_index_version,
+)
+
+ZONE_MATRIX_DIR = CACHE_DIR
+UNKNOWN_ZONE = 8
+
+
+def zip3_centroids(postal_index=None):
+    """(1000, 2) array of mean [latitude, longitude] per ZIP3 prefix, NaN if none."""
+    store = postal_index or load_postal_index()
+    data = pd.DataFrame({'latitude': store.records['lat'].astype(float),
+                         'longitude': store.records['lon'].astype(float)})
+    means = data.groupby(store.zips // 100)[['latitude', 'longitude']].mean()
+    centroids = np.full((1000, 2), np.nan)
+    centroids[means.index.to_numpy()] = means.to_numpy()
+    return centroids
+
+
+def build_zone_matrix(postal_index=None):
+    """Zone 1-8 for every (origin ZIP3, destination ZIP3) pair as a uint8 matrix."""
+    centroids = zip3_centroids(postal_index)
+    origin = np.repeat(centroids, 1000, axis=0)
+    dest = np.tile(centroids, (1000, 1))
+    miles = haversine_km(origin, dest) * KM_TO_MILES
+    return distance_category(miles).astype(np.uint8).reshape(1000, 1000)
+
+
+def zone_matrix_path(postal_index=None, directory=ZONE_MATRIX_DIR):
+    """Where the zone matrix of ``postal_index`` (default: the loaded store) is kept."""
+    return os.path.join(directory, f"zone_matrix_us-{postal_index_version(postal_index)}.npy")
+
+
+def save_zone_matrix(matrix, path):
+    """Save via a temporary file of its own, so concurrent builders never clobber each other."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fh = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with fh:
+            np.save(fh, matrix)
+        os.replace(fh.name, path)
+    except BaseException:
+        os.remove(fh.name)
+        raise
+
+
+def load_zone_matrix(postal_index=None, directory=ZONE_MATRIX_DIR):
+    """Memory-map the zone matrix of ``postal_index`` (default: the loaded store),
+    building and saving it on first use and whenever the store's version changes."""
+    return _zone_matrix(zone_matrix_path(postal_index, directory), postal_index)
+
+
+@functools.lru_cache(maxsize=None)
+def _zone_matrix(path, postal_index):
+    if not os.path.exists(path):
+        save_zone_matrix(build_zone_matrix(postal_index), path)
+        # matrices of earlier store versions are never used again
+        for old in glob.glob(os.path.join(os.path.dirname(path), "zone_matrix_us-*.npy")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass  # removed by another builder
+    return np.load(path, mmap_mode="r")
+
+
+def zip3_prefixes(zipcodes):
+    """Integer ZIP3 prefix of each 5-digit ZIP, -1 for anything else."""
+    zips = np.asarray(zipcodes, dtype=str)
+    valid = np.char.isdigit(zips) & (np.char.str_len(zips) == 5)
+    prefixes = np.full(zips.shape, -1, dtype=np.intp)
+    prefixes[valid] = zips[valid].astype("U3").astype(np.intp)  # U3 keeps the first 3 digits
+    return prefixes
+
+
+def zone_lookup(zipcode_from, zipcodes_to, matrix=None):
+    """Zone 1-8 (uint8) from ``zipcode_from`` to every destination ZIP."""
+    if matrix is None:
+        matrix = load_zone_matrix()
+    codes, uniques = factorize_zips(zipcodes_to)
+    dest = zip3_prefixes(uniques)
+    zones = np.full(len(uniques), UNKNOWN_ZONE, dtype=np.uint8)
+    origin = zip3_prefixes([zipcode_from])[0]
+    if origin >= 0:
+        known = dest >= 0
+        zones[known] = matrix[origin, dest[known]]
+    return zones[codes]
+
+
+def pair_zone_lookup(zipcodes_from, zipcodes_to, matrix=None):
+    """Zone 1-8 (uint8) for per-row (origin, destination) ZIP pairs."""
+    if matrix is None:
+        matrix = load_zone_matrix()
+    codes, origins, dests = factorize_pairs(zipcodes_from, zipcodes_to)
+    origin, dest = zip3_prefixes(origins), zip3_prefixes(dests)
+    zones = np.full(len(origins), UNKNOWN_ZONE, dtype=np.uint8)
+    known = (origin >= 0) & (dest >= 0)
+    zones[known] = matrix[origin[known], dest[known]]
+    return zones[codes]